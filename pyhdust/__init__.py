@@ -13,6 +13,10 @@ import math as _math
 import numpy as _np
 import re as _re
 import struct as _struct
+import multiprocessing as _mp
+import hashlib as _hashlib
+import json as _json
+from collections import OrderedDict as _OrderedDict
 from glob import glob as _glob
 import pyhdust.phc as _phc
 import pyhdust.jdcal as _jdcal
@@ -156,6 +160,43 @@ def hdtpath():
     return fulldir[:fulldir[:-1].rfind('/') + 1]
 
 
+_filters = {}
+# Weights matrices (see `doFilterMatrix`): the least recently used are
+# removed beyond _filtermatricesmax (x0 arrays may change in fitting loops)
+_filtermatrices = _OrderedDict()
+_filtermatricesmax = 32
+
+
+def loadFilter(filter):
+    """
+    Return the response curve of a filter of the `filters/` folder.
+
+    Each filter file is read (and its spline is built) only once; the
+    following calls return the cached values. See `clearFilterCache`.
+
+    INPUT: filter (string)
+
+    OUTPUT: fdat (array[npts, 2]; lambda in microns, response), interpfunc
+    (spline of the response)
+    """
+    key = filter.lower()
+    if key not in _filters:
+        fdat = _np.loadtxt('{}/filters/{}.dat'.format(hdtpath(), key), \
+                           skiprows=1)
+        fdat[:, 0] /= 10000.  # from Angs to microns
+        # interpfunc = interpolate.interp1d(fdat[:,0], fdat[:,1], kind='linear')
+        interpfunc = _interpolate.InterpolatedUnivariateSpline(fdat[:, 0], fdat[:, 1])
+        _filters[key] = (fdat, interpfunc)
+    return _filters[key]
+
+
+def clearFilterCache():
+    """ Clear the cached filters response curves and weights matrices. """
+    _filters.clear()
+    _filtermatrices.clear()
+    return
+
+
 def doFilterConv(x0, y0, filter):
     """
     Return the convolved filter total flux for a given flux profile y0,
@@ -165,11 +206,7 @@ def doFilterConv(x0, y0, filter):
 
     OUTPUT: summed flux (y0 units)
     """
-    fdat = _np.loadtxt('{}/filters/{}.dat'.format(hdtpath(), filter.lower()), \
-                       skiprows=1)
-    fdat[:, 0] /= 10000.  # from Angs to microns
-    # interpfunc = interpolate.interp1d(fdat[:,0], fdat[:,1], kind='linear')
-    interpfunc = _interpolate.InterpolatedUnivariateSpline(fdat[:, 0], fdat[:, 1])
+    fdat, interpfunc = loadFilter(filter)
 
     idx = _np.where((x0 >= fdat[0, 0]) & (x0 <= fdat[-1, 0]))
     x0 = x0[idx]
@@ -179,6 +216,75 @@ def doFilterConv(x0, y0, filter):
     return _np.trapz(y, x0)
 
 
+def doFilterWeights(x0, filter):
+    """
+    Return the weights of the convolved filter total flux at wavelengths x0,
+    i.e., doFilterConv(x0, y0, filter) == sum(weights*y0).
+
+    The weights include the filter response and the trapezoidal integration.
+    They can be calculated once for a given x0 and applied to many fluxes
+    (e.g., with `numpy.dot`).
+
+    INPUT: x0 lambda array, filter (string)
+
+    OUTPUT: weights array (same size of x0)
+    """
+    fdat, interpfunc = loadFilter(filter)
+
+    x0 = _np.array(x0, dtype=float)
+    weights = _np.zeros(len(x0))
+    idx = _np.where((x0 >= fdat[0, 0]) & (x0 <= fdat[-1, 0]))[0]
+    if len(idx) < 2:
+        return weights
+    dx = _np.diff(x0[idx])
+    trapw = _np.zeros(len(idx))
+    trapw[:-1] += dx / 2.
+    trapw[1:] += dx / 2.
+    weights[idx] = interpfunc(x0[idx]) * trapw
+    return weights
+
+
+def doFilterMatrix(x0, filters):
+    """
+    Return the weights matrix of a list of filters at wavelengths x0 (see
+    `doFilterWeights`). The matrix is cached for each x0 (by its hash) and
+    filters list; only the last `_filtermatricesmax` (32) used matrices are
+    kept.
+
+    INPUT: x0 lambda array, filters (list of strings)
+
+    OUTPUT: array[nlbd, nfilters]
+    """
+    x0 = _np.ascontiguousarray(x0, dtype=float)
+    key = (_hashlib.md5(x0.tobytes()).hexdigest(), tuple([filt.lower() for
+    filt in filters]))
+    if key in _filtermatrices:
+        _filtermatrices[key] = _filtermatrices.pop(key)
+    else:
+        _filtermatrices[key] = _np.array([doFilterWeights(x0, filt) for filt
+        in filters]).T
+        while len(_filtermatrices) > _filtermatricesmax:
+            _filtermatrices.popitem(last=False)
+    return _filtermatrices[key]
+
+
+def doFilterConvBatch(x0, fluxes, filters):
+    """
+    Return the convolved filters total fluxes of a set of flux profiles
+    sharing the same wavelengths x0 (see `doFilterConv`).
+
+    It is a single matrix product with the (cached) filters weights matrix
+    (`doFilterMatrix`).
+
+    INPUT: x0 lambda array, fluxes (array[nspec, nlbd]), filters (list of
+    strings)
+
+    OUTPUT: array[nspec, nfilters] (fluxes units)
+    """
+    return _np.dot(_np.asarray(fluxes, dtype=float), doFilterMatrix(x0,
+    filters))
+
+
 def doPlotFilter(pref, obs, filter, fsed2data, pol=False):
     """
     pref = output prefix; obs = integer; filter = single string
@@ -191,11 +297,7 @@ def doPlotFilter(pref, obs, filter, fsed2data, pol=False):
         y0 = fsed2data[obs, :, 3] / x0
         savename = '{}_{}_{}'.format(pref, obs, filter)
 
-    fdat = _np.loadtxt('{}filters/{}.dat'.format(hdtpath(), filter.lower()), \
-                       skiprows=1)
-    fdat[:, 0] /= 10000.
-    # interpfunc = interpolate.interp1d(fdat[:,0], fdat[:,1], kind='linear')
-    interpfunc = _interpolate.InterpolatedUnivariateSpline(fdat[:, 0], fdat[:, 1])
+    fdat, interpfunc = loadFilter(filter)
 
     idx = _np.where((x0 >= fdat[0, 0]) & (x0 <= fdat[-1, 0]))
     x0 = x0[idx]
@@ -219,49 +321,186 @@ def sed2info(file):
     """
     Read info from SED2 file.
 
+    Only the file header is read (until the first non-comment line). Binary
+    FULLSED2 files (see `mergesed2`) are also accepted.
+
     INPUT: file (path string)
 
     OUTPUT: nlbd, nobs, Rstar, Rwind (as floats)
     """
+    if _isfullsed2bin(file):
+        return _readfullsed2binhdr(file)[0]
     f0 = open(file, 'r')
-    fcont = f0.readlines()
-    f0.close()
     info = ''
-    i = 0
-    while info == '':
-        if fcont[i][0] != '%':
-            info = _np.array(fcont[i].split(), dtype=float)
-        i += 1
+    for line in f0:
+        if line[0] != '%':
+            info = _np.array(line.split(), dtype=float)
+            break
+    f0.close()
     return info
 
 
-def readfullsed2(file):
+_FSED2MAGIC = b'FULLSED2'
+
+
+def _isfullsed2bin(file):
+    """ Check if `file` is a binary FULLSED2 file. """
+    f0 = open(file, 'rb')
+    magic = f0.read(len(_FSED2MAGIC))
+    f0.close()
+    return magic == _FSED2MAGIC
+
+
+def _readfullsed2binhdr(file):
+    """ Read the header of a binary FULLSED2 file.
+
+    | The file structure (big-endian):
+    | -'FULLSED2' (8 chars)
+    | -version, nlbd, nobs, ncols (int32)
+    | -Rstar, Rwind (float64)
+    | -data (nobs*nlbd*ncols float64; same columns of the text version)
+
+    OUTPUT: nlbd, nobs, Rstar, Rwind, ncols, data offset (bytes)
+    """
+    f0 = open(file, 'rb')
+    f0.seek(len(_FSED2MAGIC))
+    version, nlbd, nobs, ncols = _np.fromfile(f0, dtype='>i4', count=4)
+    Rstar, Rwind = _np.fromfile(f0, dtype='>f8', count=2)
+    offset = f0.tell()
+    f0.close()
+    return _np.array([nlbd, nobs, Rstar, Rwind]), ncols, offset
+
+
+def _writefullsed2bin(file, fullsed2, nlbd, nobs, Rstar, Rwind):
+    """ Write a binary FULLSED2 file. See `_readfullsed2binhdr`. """
+    fullsed2 = _np.asarray(fullsed2, dtype=float)
+    f0 = open(file, 'wb')
+    f0.write(_FSED2MAGIC)
+    _np.array([1, nlbd, nobs, fullsed2.shape[-1]], dtype='>i4').tofile(f0)
+    _np.array([Rstar, Rwind], dtype='>f8').tofile(f0)
+    fullsed2.astype('>f8').tofile(f0)
+    f0.close()
+    return
+
+
+def _sed2cache(file):
+    """ Return the path of the .npy cache of a (full)SED2 file. It is keyed on
+    the file modification time and size. """
+    fstat = _os.stat(file)
+    return '{0}.{1:d}_{2:d}.npy'.format(file, int(fstat.st_mtime),
+    fstat.st_size)
+
+
+def _parsesed2data(fcont, width=13):
+    """ Parse the data block (string) of a (full)SED2 file at once.
+
+    The values are parsed as a whitespace separated sequence. If there are
+    values without separator (e.g., `%13.6f` values filling the 13
+    characters) or the parsing fails, the lines are sliced in fixed-width
+    columns of `width` characters.
+
+    OUTPUT: array[nlines,ncols] (None if it is not a regular table)
+    """
+    fcont = fcont.rstrip(b'\r\n')
+    if len(fcont.strip()) == 0:
+        return None
+    nlines = fcont.count(b'\n') + 1
+    ncols = len(fcont.split(b'\n', 1)[0].split())
+    # a digit or point followed by a sign, or two points in a value
+    if _re.search(br'[0-9.][-+]|\.[0-9]*\.', fcont) is None:
+        try:
+            sed2data = _np.fromstring(fcont, sep=' ')
+        except ValueError:
+            sed2data = []
+        if len(sed2data) == nlines*ncols:
+            return sed2data.reshape((nlines, ncols))
+    lines = fcont.replace(b'\r', b'').split(b'\n')
+    llen = len(lines[0])
+    if llen % width != 0 or any([len(line) != llen for line in lines]):
+        return None
+    try:
+        sed2data = _np.array(lines).view('S{0}'.format(width)).astype(float)
+    except ValueError:
+        return None
+    return sed2data.reshape((nlines, -1))
+
+
+def _readsed2data(file, skiprows, cache=False):
+    """ Single-pass reading of the data block of a (full)SED2 file.
+
+    The data block is parsed at once (see `_parsesed2data`);
+    `numpy.loadtxt` is only used if this fails.
+
+    If `cache` == True, the data is saved in a .npy sidecar file, keyed on the
+    file modification time and size, and later reads memory-map it.
+
+    OUTPUT: array[nlines,ncols]
+    """
+    if cache:
+        npyfile = _sed2cache(file)
+        if _os.path.exists(npyfile):
+            return _np.load(npyfile, mmap_mode='r')
+    f0 = open(file, 'rb')
+    for i in range(skiprows):
+        f0.readline()
+    fcont = f0.read()
+    f0.close()
+    sed2data = _parsesed2data(fcont)
+    if sed2data is None:
+        sed2data = _np.loadtxt(file, skiprows=skiprows)
+    if cache:
+        for oldfile in _glob(_glob_escape(file)+'.*_*.npy'):
+            _os.remove(oldfile)
+        _np.save(npyfile, sed2data)
+    return sed2data
+
+
+def _glob_escape(path):
+    """ Escape the glob special characters of a path. """
+    return _re.sub(r'([\[\]\?\*])', r'[\1]', path)
+
+
+@_phc.filecache
+def readfullsed2(file, cache=False):
     """
     Read data from FULLSED2 file.
 
+    If `cache` == True, a .npy sidecar file (keyed on the file modification
+    time and size) is saved and the following reads are memory-mapped.
+
+    Binary FULLSED2 files (see `mergesed2`) are detected automatically and
+    memory-mapped.
+
     INPUT: file (path string)
 
     OUTPUT: array[nobs,nlbd,-1]
         number of columns from SED2file replaces "-1"
     """
+    if _isfullsed2bin(file):
+        info, ncols, offset = _readfullsed2binhdr(file)
+        return _np.memmap(file, dtype='>f8', mode='r', offset=offset,
+        shape=(int(info[1]), int(info[0]), ncols))
     nlbd, nobs, Rstar, Rwind = sed2info(file)
-    sed2data = _np.loadtxt(file, skiprows=5)
-    sed2data = sed2data.reshape((nobs, nlbd, -1))
+    sed2data = _readsed2data(file, 5, cache=cache)
+    sed2data = sed2data.reshape((int(nobs), int(nlbd), -1))
     return sed2data
 
 
-def readsed2(file):
+@_phc.filecache
+def readsed2(file, cache=False):
     """
     Read data from SED2 file.
 
+    If `cache` == True, a .npy sidecar file (keyed on the file modification
+    time and size) is saved and the following reads are memory-mapped.
+
     INPUT: file (path string)
 
     OUTPUT: array[nobs*nlbd,-1]
         number of columns from SED2file replaces "-1".
         NOTE: this format is different of `readfullsed2`.
     """
-    nlbd, nobs, Rstar, Rwind = sed2info(file)
-    sed2data = _np.loadtxt(file, skiprows=1)
+    sed2data = _readsed2data(file, 1, cache=cache)
     return sed2data
 
 
@@ -304,7 +543,8 @@ def chkObsLog(path=None, nights=None, badweath=None):
     return
 
 
-def readtemp(tfile, quiet=False):
+@_phc.filecache
+def readtemp(tfile, quiet=False, mmap=False):
     """ Read *.temp file
 
     - ncr = número de células da simulação na coordenada radial
@@ -322,50 +562,62 @@ def readtemp(tfile, quiet=False):
     - pcmu = distância entre as células em mu
     - pcphi = distância entre as células em phi
 
+    If `mmap` == True, `data` is a memory-mapped (big-endian float32) view of
+    the file. Only the levels/cells actually used (e.g., `data[3+lev]`) are
+    read from disk.
+
     OUTPUT = ncr,ncmu,ncphi,nLTE,nNLTE,Rstar,Ra,beta,data,pcr,pcmu,pcphi
     """
-    f = open(tfile).read()
-    ixdr=0
-    ncr, ncmu, ncphi, nLTE, nNLTE = _struct.unpack('>5l', f[ixdr:ixdr+4*5])
-    ixdr+=4*5
-    Rstar, Ra, beta = _struct.unpack('>3f', f[ixdr:ixdr+4*3])
-    ixdr+=4*3
+    f0 = open(tfile, 'rb')
+    # Python ints: int32 products overflow for files larger than 2 GB
+    ncr, ncmu, ncphi, nLTE, nNLTE = [int(n) for n in _np.fromfile(f0,
+    dtype='>i4', count=5)]
+    Rstar, Ra, beta = _np.fromfile(f0, dtype='>f4', count=3).astype(float)
+    ixdr = f0.tell()
     #~ 
     rlen = (nLTE+6)*ncr*ncmu*ncphi
-    data = _struct.unpack('>{0}f'.format(rlen), f[ixdr:ixdr+4*rlen])
+    if mmap:
+        f0.close()
+        data = _np.memmap(tfile, dtype='>f4', mode='r', offset=ixdr,
+        shape=(ncphi,ncmu,ncr,nLTE+6)).transpose()
+    else:
+        data = _np.fromfile(f0, dtype='>f4', count=rlen).astype(float)
+        f0.close()
+        data = _np.reshape(data, (nLTE+6,ncr,ncmu,ncphi), order='F')
     ixdr+=4*rlen
-    data = _np.reshape(data, (nLTE+6,ncr,ncmu,ncphi), order='F')
     #~
     #this will check if the XDR is finished.
-    if ixdr == len(f):
+    flen = _os.path.getsize(tfile)
+    if ixdr == flen:
         if not quiet:
             print('# XDR {0} completely read!'.format(tfile))
     else:
         print('# Warning: XDR {0} not completely read!'.format(tfile))
-        print('# length difference is {0}'.format( (len(f)-ixdr)/4 ) )
-    #~
-    pcrc = data[0,:,0,0]
-    pcr = _np.zeros(ncr+1)
-    pcr[0] = Rstar
-    for icr in range(1,ncr+1):
-        pcr[icr] = pcr[icr-1] + 2*(pcrc[icr-1]-pcr[icr-1])
-    pcmu = _np.zeros((ncmu+1,ncr))
-    #~ 
-    for icr in range(0, ncr):
-        pcmuc = data[1,icr,:,0]
-        pcmu[0,icr] = -1.
-        for icmu in range(1,ncmu+1):
-            pcmu[icmu,icr] = pcmu[icmu-1,icr] + 2.*(pcmuc[icmu-1]-pcmu[icmu-1,icr])
+        print('# length difference is {0}'.format( (flen-ixdr)/4 ) )
     #~
-    pcphic = data[2,0,0,:]
-    pcphi = _np.zeros(ncphi+1)
-    pcphi[0] = 0.
-    for icphi in range(1,ncphi+1):
-        pcphi[icphi] = pcphi[icphi-1] + 2*(pcphic[icphi-1]-pcphi[icphi-1])
+    pcr = _celledges(_np.array(data[0,:,0,0], dtype=float), Rstar)
+    pcmu = _celledges(_np.array(data[1,:,:,0], dtype=float).T, -1.)
+    pcphi = _celledges(_np.array(data[2,0,0,:], dtype=float), 0.)
     #~ 
     return ncr,ncmu,ncphi,nLTE,nNLTE,Rstar,Ra,beta,data,pcr,pcmu,pcphi
 
 
+def _celledges(centers, edge0):
+    """ Return the cells edges from the cells centers (along the first axis)
+    and the first edge `edge0`, i.e., the solution of
+
+    edges[i] = edges[i-1] + 2*(centers[i-1]-edges[i-1])
+
+    OUTPUT: array (len(centers)+1, ...)
+    """
+    sign = (-1.)**_np.arange(1, len(centers)+1)
+    sign = sign.reshape((-1,)+(1,)*(centers.ndim-1))
+    edges = _np.zeros((len(centers)+1,)+centers.shape[1:])
+    edges[0] = edge0
+    edges[1:] = sign*(edge0 + 2*_np.cumsum(sign*centers, axis=0))
+    return edges
+
+
 def readdust(tfile):
     """ TBD!!
 
@@ -464,7 +716,7 @@ def plottemp(tfiles, philist=[0], interpol=False, xax=0, fmts=['png'],
     for i in range(len(tfiles)):
         rtfile = tfiles[i]
         ncr,ncmu,ncphi,nLTE,nNLTE,Rstar,Ra,beta,data,pcr,pcmu,pcphi = \
-        readtemp(rtfile, quiet=True)
+        readtemp(rtfile, quiet=True, mmap=True)
         for phiidx in range(0,len(philist)):
             icphi = philist[phiidx]
             x = data[0,:,0,icphi]
@@ -493,7 +745,157 @@ def plottemp(tfiles, philist=[0], interpol=False, xax=0, fmts=['png'],
     return
 
 
-def mergesed2(models, Vrots, path=None):
+def _readsed2all(file):
+    """ Read the info and the data of a SED2 file in a single pass.
+
+    OUTPUT: info (nlbd, nobs, Rstar, Rwind), data (see `readsed2`)
+    """
+    f0 = open(file, 'rb')
+    info = _np.array(f0.readline().split(), dtype=float)
+    fcont = f0.read()
+    f0.close()
+    sed2data = _parsesed2data(fcont)
+    if sed2data is None:
+        sed2data = _np.loadtxt(file, skiprows=1)
+    return info, sed2data
+
+
+def _mergesed2model(model, Vrot, interactive=True, binary=False):
+    """ Merge the mod#/*.sed2 files of a single model into its fullsed file.
+    See `mergesed2`.
+
+    Each SED2 file is read only once. If `interactive` == False, the SED2
+    files with different HDUST output (header) are recorded in the returned
+    list, instead of asking what to do.
+
+    OUTPUT: list of warnings (strings)
+    """
+    sufbands = ['SED', 'UV', 'IR', 'NIR', 'BALMER', 'PASCHEN', 'CM', 'MM',  # 0-7
+                'J', 'H', 'K', 'L', 'M', 'N', 'Q1', 'Q2']  # 8-14
+    # wavelength in microns
+    suflines = {'H12': .372300, 'H11': .373543, 'H10': .375122, 'H9': .377170,
+    'H8': .379899, 'H7': .383649, 'H6': .389017, 'H5': .397120, 'Hd': .410289,
+    'Hg': .434169, 'Hb':.486271, 'Ha':.656461, 'Br13':1.61137, 'Br12':1.6416,
+    'Brg': 2.166}
+
+    def chkinfo(file, info, msg):
+        """ Check if the SED2 file has the info as the first file """
+        if _np.product((nobs, Rstar, Rwind) == info[1:]) == 0:
+            warn = '# WARNING: {0} has different HDUST {1}!!! ({2})'.\
+            format(modelname, msg, file)
+            if not interactive:
+                return [warn]
+            key = ''
+            while key.upper() != 'Y':
+                print(warn)
+                key = raw_input('Do you want do proceed? (y/other): ')
+        return []
+
+    report = []
+    model = model.replace('.inp', '.txt')
+    modfld, modelname = _phc.trimpathname(model)
+    path = _phc.trimpathname(modfld[:-1])[0]
+    if not _os.path.exists('{0}fullsed'.format(path)):
+        try:
+            _os.makedirs('{0}fullsed'.format(path))
+        except OSError:
+            pass
+    #
+    #~ modelname = modelname.replace('.txt','.inp')
+    sed2data = _np.empty(0)
+    sfound = []
+    #Process broad-bands
+    for suf in sufbands:
+        file = modfld + '{0}_{1}.sed2'.format(suf, modelname.replace(".txt", ""))
+        if _os.path.exists(file):
+            sfound += [suf]
+            info, newdata = _readsed2all(file)
+            if len(sed2data) == 0:
+                sed2data = newdata.copy()
+                nlbd, nobs, Rstar, Rwind = info
+            else:
+                report += chkinfo(file, info, 'output')
+                nlbd += info[0]
+                sed2data = _np.vstack((sed2data, newdata))
+    #Process lines
+    for suf in suflines:
+        file = modfld + '{0}_{1}_SEI.sed2'.format(suf, modelname.replace(".txt", ""))
+        if _os.path.exists(file):
+            sfound += [suf]
+            info, newdata = _readsed2all(file)
+            #print("# TRIMMING INPUT SPECTRUM {}".format(modelname))
+            #print("# TO ACCOUNT FOR THE NON-ZERO ROTATION VELOCITY.")
+            deltalbd = Vrot / _phc.c.cgs / 1e-5 * suflines[suf]
+            mini = newdata[0, 2] + deltalbd
+            maxi = newdata[-1, 2] - deltalbd
+            #print deltalbd, Vrot
+            idx = _np.where((newdata[:, 2] >= mini) & (newdata[:, 2] <= maxi))
+            #print len(newdata), len(newdata[idx])
+            ncut = len(newdata) - len(newdata[idx])
+            newdata = newdata[idx]
+            if len(sed2data) == 0:
+                sed2data = newdata.copy()
+                nlbd, nobs, Rstar, Rwind = info
+            else:
+                report += chkinfo(file, info, 'input')
+                idx = _np.where((sed2data[:, 2] < mini) | (sed2data[:, 2] > maxi))
+                ncut += len(sed2data) - len(sed2data[idx])
+                sed2data = sed2data[idx]
+                nlbd += info[0] - ncut / info[1]
+                sed2data = _np.vstack((sed2data, newdata))
+
+    if len(sfound) > 0:
+        print('# PROCESSED: {0} with {1}'.format(model, sfound))
+        fullsed2 = _np.zeros((len(sed2data), 16))
+        fullsed2[:, 0:3 + 1] = sed2data[:, 0:3 + 1]
+        fullsed2[:, 4] = sed2data[:, 11]
+        fullsed2[:, 5] = sed2data[:, 19]
+        fullsed2[:, 6] = sed2data[:, 27]
+        fullsed2[:, 7:8 + 1] = sed2data[:, 4:5 + 1]
+
+        #a = _np.arange(9).reshape(3,3)
+        #_np.core.records.fromarrays(a.transpose(), names='a,b,c', formats='f4,f4,f4')
+        #fullsed2 = fullsed2[fullsed2[:,2].argsort()]
+        #fullsed2 = fullsed2[fullsed2[:,0].argsort()]
+        fullsed2 = _np.core.records.fromarrays(fullsed2.transpose(), names= \
+            'MU,PHI,LAMBDA,FLUX,SCT FLUX,EMIT FLUX,TRANS FLUX,Q,U,Sig FLUX,\
+            Sig SCT FLUX,Sig EMIT FLUX,Sig TRANS FLU,Sig Q,Sig U',
+                                               formats='f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8')
+        idx = _np.argsort(fullsed2, order=('MU', 'LAMBDA'))
+        fullsed2 = fullsed2[idx]
+
+        hd = '%CONTAINS: {0}\n'.format(' + '.join(sfound))
+        hd += '%CREATED: {0}\n'.format(_time.asctime(_time.localtime(_time.time())))
+        hd += '%{0:>7s}{1:>8s}{2:>13s}{3:>13s}'.format('nlbd', 'nobs', 'Rstar', 'Rwind') + '\n'
+        hd += '{0:8d}{1:8d}{2:13.4f}{3:13.2f}\n'.format(int(nlbd), int(nobs), Rstar, Rwind)
+        hd += '%{0:>12s}'.format('MU') + (15 * '{:>13s}').format('PHI', 'LAMBDA', 'FLUX', \
+                                                                  'SCT FLUX', 'EMIT FLUX', 'TRANS FLUX', 'Q', 'U',
+                                                                  'Sig FLUX', 'Sig FLUX', \
+                                                                  'SigSCTFLX', 'SigEMITFLX', 'SigTRANSFLX',
+                                                                  'Sig Q', 'Sig U')
+
+        fsedfile = path + 'fullsed/fullsed_' + modelname.replace('.txt', '.sed2')
+        if binary:
+            _writefullsed2bin(fsedfile, fullsed2.view('f8').reshape((-1, 16)),
+            int(nlbd), int(nobs), Rstar, Rwind)
+        else:
+            _np.savetxt(fsedfile, fullsed2, header=hd, comments="",
+            fmt='%13.6f', delimiter='')
+    else:
+        warn = '# WARNING: No SED2 found for {0}'.format(model)
+        print(warn)
+        report += [warn]
+    return report
+
+
+def _mergesed2par(args):
+    """ `_mergesed2model` wrapper for `multiprocessing.Pool.imap`. """
+    model, Vrot, binary = args
+    return model, _mergesed2model(model, Vrot, interactive=False,
+    binary=binary)
+
+
+def mergesed2(models, Vrots, path=None, binary=False):
     """
     Merge all mod#/*.sed2 files into the fullsed file.
     
@@ -505,118 +907,54 @@ def mergesed2(models, Vrots, path=None):
     
     NO AVERAGE is coded (yet).
 
-    INPUT: models lists (*.txt or *.inp), Vrots (array).
+    If `binary` == True, the fullsed file is saved in binary format (header
+    info + float64 (nobs, nlbd, 16) array) instead of text. It is faster,
+    keeps the full precision and it is memory-mapped by `readfullsed2`.
+
+    See `mergesed2batch` for the parallel (and non-interactive) version.
+
+    INPUT: models lists (*.txt or *.inp), Vrots (array), binary.
 
     OUTPUT: *files written (status printed).
     """
-    sufbands = ['SED', 'UV', 'IR', 'NIR', 'BALMER', 'PASCHEN', 'CM', 'MM',  # 0-7
-                'J', 'H', 'K', 'L', 'M', 'N', 'Q1', 'Q2']  # 8-14
-    # wavelength in microns
-    suflines = {'H12': .372300, 'H11': .373543, 'H10': .375122, 'H9': .377170,
-    'H8': .379899, 'H7': .383649, 'H6': .389017, 'H5': .397120, 'Hd': .410289,
-    'Hg': .434169, 'Hb':.486271, 'Ha':.656461, 'Br13':1.61137, 'Br12':1.6416,
-    'Brg': 2.166}
-
-    for model in models:
-        model = model.replace('.inp', '.txt')
-        modfld, modelname = _phc.trimpathname(model)
-        path = _phc.trimpathname(modfld[:-1])[0]
-        if not _os.path.exists('{0}fullsed'.format(path)):
-            _os.system('mkdir {0}fullsed'.format(path))
-        #
-        #~ modelname = modelname.replace('.txt','.inp')
-        sed2data = _np.empty(0)
-        sfound = []
-        #Process broad-bands
-        for suf in sufbands:
-            file = modfld + '{0}_{1}.sed2'.format(suf, modelname.replace(".txt", ""))
-            if _os.path.exists(file):
-                sfound += [suf]
-                newdata = readsed2(file)
-                if len(sed2data) == 0:
-                    sed2data = newdata.copy()
-                    nlbd, nobs, Rstar, Rwind = sed2info(file)
-                else:
-                    #Check if the SED2 file has the info as the first file
-                    if _np.product((nobs, Rstar, Rwind) == sed2info(file)[1:]) == 0:
-                        key = ''
-                        while key.upper() != Y:
-                            print('# WARNING: {0} has different HDUST output!!!'. \
-                                  format(modelname))
-                            key = raw_input('Do you want do proceed? (y/other): ')
-                    nlbd += sed2info(file)[0]
-                    sed2data = _np.vstack((sed2data, newdata))
-        #Process lines
-        Vrot = Vrots[models.index(model)]
-        for suf in suflines:
-            file = modfld + '{0}_{1}_SEI.sed2'.format(suf, modelname.replace(".txt", ""))
-            if _os.path.exists(file):
-                sfound += [suf]
-                newdata = readsed2(file)
-                #print("# TRIMMING INPUT SPECTRUM {}".format(modelname))
-                #print("# TO ACCOUNT FOR THE NON-ZERO ROTATION VELOCITY.")
-                deltalbd = Vrot / _phc.c.cgs / 1e-5 * suflines[suf]
-                mini = newdata[0, 2] + deltalbd
-                maxi = newdata[-1, 2] - deltalbd
-                #print deltalbd, Vrot
-                idx = _np.where((newdata[:, 2] >= mini) & (newdata[:, 2] <= maxi))
-                #print len(newdata), len(newdata[idx])
-                ncut = len(newdata) - len(newdata[idx])
-                newdata = newdata[idx]
-                if len(sed2data) == 0:
-                    sed2data = newdata.copy()
-                    nlbd, nobs, Rstar, Rwind = sed2info(file)
-                else:
-                    #Check if the SED2 file has the info as the first file
-                    if _np.product((nobs, Rstar, Rwind) == sed2info(file)[1:]) == 0:
-                        key = ''
-                        while key.upper() != Y:
-                            print('# WARNING: {0} has different HDUST input!!!'. \
-                                  format(modelname))
-                            key = raw_input('Do you want do proceed? (y/other): ')
-                    idx = _np.where((sed2data[:, 2] < mini) | (sed2data[:, 2] > maxi))
-                    ncut += len(sed2data) - len(sed2data[idx])
-                    sed2data = sed2data[idx]
-                    nlbd += sed2info(file)[0] - ncut / sed2info(file)[1]
-                    sed2data = _np.vstack((sed2data, newdata))
-
-        if len(sfound) > 0:
-            print('# PROCESSED: {0} with {1}'.format(model, sfound))
-            fullsed2 = _np.zeros((len(sed2data), 16))
-            fullsed2[:, 0:3 + 1] = sed2data[:, 0:3 + 1]
-            fullsed2[:, 4] = sed2data[:, 11]
-            fullsed2[:, 5] = sed2data[:, 19]
-            fullsed2[:, 6] = sed2data[:, 27]
-            fullsed2[:, 7:8 + 1] = sed2data[:, 4:5 + 1]
-
-            #a = _np.arange(9).reshape(3,3)
-            #_np.core.records.fromarrays(a.transpose(), names='a,b,c', formats='f4,f4,f4')
-            #fullsed2 = fullsed2[fullsed2[:,2].argsort()]
-            #fullsed2 = fullsed2[fullsed2[:,0].argsort()]
-            fullsed2 = _np.core.records.fromarrays(fullsed2.transpose(), names= \
-                'MU,PHI,LAMBDA,FLUX,SCT FLUX,EMIT FLUX,TRANS FLUX,Q,U,Sig FLUX,\
-                Sig SCT FLUX,Sig EMIT FLUX,Sig TRANS FLU,Sig Q,Sig U',
-                                                   formats='f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8,f8')
-            idx = _np.argsort(fullsed2, order=('MU', 'LAMBDA'))
-            fullsed2 = fullsed2[idx]
-
-            hd = '%CONTAINS: {0}\n'.format(' + '.join(sfound))
-            hd += '%CREATED: {0}\n'.format(_time.asctime(_time.localtime(_time.time())))
-            hd += '%{0:>7s}{1:>8s}{2:>13s}{3:>13s}'.format('nlbd', 'nobs', 'Rstar', 'Rwind') + '\n'
-            hd += '{0:8d}{1:8d}{2:13.4f}{3:13.2f}\n'.format(int(nlbd), int(nobs), Rstar, Rwind)
-            hd += '%{0:>12s}'.format('MU') + (15 * '{:>13s}').format('PHI', 'LAMBDA', 'FLUX', \
-                                                                      'SCT FLUX', 'EMIT FLUX', 'TRANS FLUX', 'Q', 'U',
-                                                                      'Sig FLUX', 'Sig FLUX', \
-                                                                      'SigSCTFLX', 'SigEMITFLX', 'SigTRANSFLX',
-                                                                      'Sig Q', 'Sig U')
-
-            _np.savetxt(path + 'fullsed/fullsed_' + modelname.replace('.txt', '.sed2'), \
-                        fullsed2, header=hd, comments="", fmt='%13.6f', delimiter='')
-        else:
-            print('# WARNING: No SED2 found for {0}'.format(model))
+    for model, Vrot in zip(models, Vrots):
+        _mergesed2model(model, Vrot, binary=binary)
     return
 
 
+def mergesed2batch(models, Vrots, nproc=None, report='mergesed2_report.txt',
+    binary=False):
+    """
+    Merge all mod#/*.sed2 files into the fullsed files, in parallel.
+
+    It is the same of `mergesed2`, but the models are merged by a pool of
+    `nproc` processes (default: number of CPUs) and it never stops to ask
+    what to do: the SED2 files with different HDUST headers (and the models
+    without SED2 files) are recorded in the `report` file (None to skip it).
+
+    INPUT: models lists (*.txt or *.inp), Vrots (array), nproc, report,
+    binary (see `mergesed2`)
+
+    OUTPUT: *files written (status printed); dictionary {model: warnings}
+    """
+    pool = _mp.Pool(nproc)
+    try:
+        out = dict(pool.imap_unordered(_mergesed2par, [(model, Vrot, binary)
+        for model, Vrot in zip(models, Vrots)]))
+    finally:
+        pool.close()
+        pool.join()
+    nwarn = sum([len(out[model]) for model in out])
+    if report is not None:
+        f0 = open(report, 'w')
+        for model in models:
+            for warn in out.get(model, []):
+                f0.writelines('{0}\n'.format(warn))
+        f0.close()
+        print('# {0} warnings recorded in {1}'.format(nwarn, report))
+    return out
+
+
 def calcTeff(lum, size, M=None):
     """
     Calculate Teff for the non-rotating case.
@@ -651,7 +989,48 @@ def calclogg(M, R):
     return logg
 
 
-def genlog(path=None, extrainfo=None):
+def _genlogfld(modn):
+    """ Catalogue of the models of a single mod# folder. See `genlog`.
+
+    The folder is listed only once and its files are grouped by model
+    suffix.
+
+    OUTPUT: list of [suf, step, sed2, maps] rows
+    """
+    modnn = _phc.trimpathname(modn)[1]
+    files = sorted(_os.listdir(modn))
+    sufs = [x[:-4] for x in files if (x.find('.txt') > -1 and x.find('{0}_'.\
+    format(modnn)) >-1 )]
+    #~ Each suffix is identified by its position related to "mod#_" and size.
+    #~ A file belongs to the longest suffix it contains.
+    keys = set([(suf.find('{0}_'.format(modnn)), len(suf)) for suf in sufs])
+    keys = sorted(keys, key=lambda key: -key[1])
+    sufset = set(sufs)
+    groups = dict([(suf, []) for suf in sufs])
+    for x in files:
+        i = x.find('{0}_'.format(modnn))
+        if i == -1:
+            continue
+        for k, n in keys:
+            if i-k >= 0 and x[i-k:i-k+n] in sufset:
+                groups[x[i-k:i-k+n]] += [x]
+                break
+    rows = []
+    for suf in sufs:
+        sufglob = groups[suf]
+        step1 = [x for x in sufglob if (x.find('.temp') > -1 and
+        x.startswith('{0}_'.format(modnn)) and x.find('_avg') == -1)]
+        if len(step1) == 0:
+            step1 = ['0']
+        s2out = '+'.join([x[:x.find('_')] for x in sufglob if
+        x.find('.sed2') > -1])
+        mout = '+'.join([x[:x.find('_')] for x in sufglob if
+        x.find('.map') > -1])
+        rows += [[suf, step1[-1][-7:-5], s2out, mout]]
+    return rows
+
+
+def genlog(path=None, extrainfo=None, manifest=True):
     """Gen. log of the calculated models of the project.
 
     ppath = Project's path. If it is not given, it assumes the local pwd.
@@ -664,6 +1043,11 @@ def genlog(path=None, extrainfo=None):
     | 'mod05':'i=60+70/?',\
     | 'mod06':'i=60+70/?'}
 
+    Each mod# folder is listed once. If `manifest` == True, the catalogue of
+    each folder is saved in `path`/log.manifest together with the folder
+    modification time, so the next runs only examine the folders that
+    changed.
+
     INPUT: *path (string), *extrainfo (dictionary with modn number as index)
 
     OUTPUT: file written.
@@ -671,67 +1055,47 @@ def genlog(path=None, extrainfo=None):
     if path == None:
         path = _os.getcwd()
     modfld = _glob('{0}/mod*'.format(path))
+    modfld = [modn for modn in modfld if _os.path.isdir(modn)]
     # while len(modfld) == 0:
     #    proj = raw_input('Type the project name: ')
     #    modfld = _glob('{0}/mod*'.format(proj))
     modfld.sort()
+    mfile = '{0}/log.manifest'.format(path)
+    mdata = {}
+    if manifest and _os.path.exists(mfile):
+        f0 = open(mfile)
+        mdata = _json.load(f0)
+        f0.close()
 
     #MODN, steps, sed2, maps, extrainfo
-    tab = _np.zeros((5000, 5), dtype='|S127')
-    i = 0
+    tab = []
+    newmdata = {}
 
     for modn in modfld:
         modnn = _phc.trimpathname(modn)[1]
-        modglob = _glob('{0}/*'.format(modn))
-        mods = [x for x in modglob if (x.find('.txt') > -1 and x.find('{0}_'.\
-        format(modnn)) >-1 )]
-        print('# Catalogue of {0}'.format(modn))
-        for mod in mods:
-            suf = mod[mod.rfind('/') + 1:-4]
-
-            #~ step1 = _glob('{0}/{1}??.temp'.format(modn, suf))
-            sufglob = [x for x in modglob if (x.find(suf) > -1)]
-            step1 = [x for x in sufglob if (x.find('.temp') > -1 and
-            x.find('/{0}_'.format(modnn)) >-1 and x.find('_avg') == -1)]
-            if len(step1) == 0:
-                step1 = ['0']
-            step1.sort()
-
-            #~ sed2 = _glob('{0}/*{1}_*.sed2'.format(modn, suf))
-            #~ sed2 += _glob('{0}/*{1}.sed2'.format(modn, suf))
-            sed2 = [x for x in sufglob if x.find('.sed2') > -1]
-            sed2.sort()
-            s2out = ''
-            for sedi in sed2:
-                s2out += sedi[sedi.rfind('/') + 1:sedi.find('_')] + '+'
-
-            #~ maps = _glob('{0}/*{1}_*.maps'.format(modn, suf))
-            #~ maps += _glob('{0}/*{1}.maps'.format(modn, suf))
-            maps = [x for x in sufglob if x.find('.map') > -1]
-            maps.sort()
-            mout = ''
-            for mapi in maps:
-                mout += mapi[mapi.rfind('/') + 1:mapi.find('_')] + '+'
-
-            if extrainfo != None:
-                if modnn in extrainfo:
-                    extra = extrainfo[modnn]
-            else:
-                extra = ''
+        mtime = _os.path.getmtime(modn)
+        if modnn in mdata and mdata[modnn]['mtime'] == mtime:
+            rows = mdata[modnn]['rows']
+        else:
+            print('# Catalogue of {0}'.format(modn))
+            rows = _genlogfld(modn)
+        newmdata[modnn] = {'mtime': mtime, 'rows': rows}
 
-            tab[i] = (suf, step1[-1][-7:-5], s2out[:-1], mout[:-1], extra)
-            i += 1
+        extra = ''
+        if extrainfo != None:
+            extra = extrainfo.get(modnn, '')
+        tab += [row + [extra] for row in rows]
 
-        if len(mods) == 0:
+        if len(rows) == 0:
             print('# NO model found in {0}'.format(modn))
 
-    #tab = tab[:i,:]
-    #tab = tab[tab[:,0].argsort()]
-    #_np.savetxt('log.csv', tab, fmt='%s', delimiter=',')
-    _np.savetxt('{0}/log.csv'.format(path), tab[:i, :], fmt='%s', delimiter=',')
-    #tab = _np.loadtxt('log.csv', dtype=str)
-    #tab = tab[tab[:,0].argsort()]
-    #_np.savetxt('log.csv', tab, fmt='%s', delimiter=',')
+    if manifest:
+        f0 = open(mfile, 'w')
+        _json.dump(newmdata, f0)
+        f0.close()
+    f0 = open('{0}/log.csv'.format(path), 'w')
+    f0.writelines(['{0}\n'.format(','.join(row)) for row in tab])
+    f0.close()
     print('# Generated {0}/log.csv !'.format(path))
     return
 
@@ -901,37 +1265,23 @@ def rotStar(Tp=20000., M=10.3065, rp=5.38462, star='B', beta=0.25, wfrac=0.8,
         Tp = (Tp*Lsun/4./_np.pi/rp**2/sigma)**.25
 
     ### DEFS ###
+    ths = _np.linspace(_np.pi / 2, 0, th_res)
+
     def rt(th, wfrac):
-        if th == 0:
-            r = 1.
-        else:
-            r = (-3. * _np.cos((_np.arccos(wfrac * _np.sin(th)) + 4 * _np.pi) / 3)) / (wfrac * _np.sin(th))
-        return r
+        return _rotrt(th, wfrac)
 
     def area(wfrac):
-        ths = _np.linspace(_np.pi / 2, 0, th_res)
-        a = 0.
-        for i in range(len(ths)):
-            a = a + 2 * _np.pi * rt(ths[i], wfrac) ** 2 * _np.sin(ths[i])
-        return 2 * a * ths[-2]
+        return 2 * ths[-2] * _np.sum(2 * _np.pi * rt(ths, wfrac) ** 2 * _np.sin(ths))
 
     def g(wfrac, M, rp, th):
-        wcrit = _np.sqrt(8 * G * M / (27 * rp ** 3))
-        g = (wcrit * wfrac) ** 2 * rp * rt(th, wfrac) * _np.sin(th) ** 2 - G * M / (rp * rt(th, wfrac)) ** 2
-        return g
+        return _rotg(th, wfrac, M, rp)
 
     def lum(wfrac, Tp, rp, M, C, beta):
-        ths = _np.linspace(_np.pi / 2, 0, th_res)
-        l = 0.
-        for i in range(len(ths)):
-            l = l + rt(ths[i], wfrac) ** 2 * _np.sin(ths[i]) * (abs(g(wfrac, M, rp, ths[i]))) ** (4 * beta)
+        l = _np.sum(rt(ths, wfrac) ** 2 * _np.sin(ths) * (abs(g(wfrac, M, rp, ths))) ** (4 * beta))
         return 2 * 2 * _np.pi * ths[-2] * sigma * rp ** 2 * C ** (4 * beta) * l
 
     def lumf(wfrac, Tp, rp, M, beta):
-        ths = _np.linspace(_np.pi / 2, 0, th_res)
-        l = 0.
-        for i in range(len(ths)):
-            l = l + rt(ths[i], wfrac) ** 2 * _np.sin(ths[i]) * abs(g(wfrac, M, rp, ths[i])) ** (4 * beta)
+        l = _np.sum(rt(ths, wfrac) ** 2 * _np.sin(ths) * abs(g(wfrac, M, rp, ths)) ** (4 * beta))
         return l * ths[-2] * rp ** 2
 
     Bstars = _np.array(_phc.bestars, dtype=str)
@@ -990,6 +1340,72 @@ def rotStar(Tp=20000., M=10.3065, rp=5.38462, star='B', beta=0.25, wfrac=0.8,
     return ob, (Cw * abs(g(wfrac, M, rp, 0.))) ** beta, area(wfrac)*(rp**2)
 
 
+def _rotrt(th, wfrac):
+    """ Radius (in units of the polar radius) of a Roche rotating star at
+    colatitude `th` (arrays are accepted; scalars return a scalar). """
+    wsin = _np.asarray(wfrac * _np.sin(th), dtype=float)
+    nz = _np.where(wsin == 0, 1., wsin)
+    r = _np.where(wsin == 0, 1.,
+        (-3. * _np.cos((_np.arccos(nz) + 4 * _np.pi) / 3)) / nz)
+    return r[()]
+
+
+def _rotg(th, wfrac, M, rp):
+    """ Effective gravity (cgs) of a Roche rotating star at colatitude `th`
+    (arrays are accepted). `M` and `rp` in cgs units. """
+    G = _phc.G.cgs
+    wcrit = _np.sqrt(8 * G * M / (27 * rp ** 3))
+    r = _rotrt(th, wfrac)
+    return (wcrit * wfrac) ** 2 * rp * r * _np.sin(th) ** 2 - G * M / (rp * r) ** 2
+
+
+def rotStarArr(Tp=20000., M=10.3065, rp=5.38462, beta=0.25, wfrac=0.8,
+               th_res=5001, LnotTp=False):
+    """ Vectorized version of `rotStar`.
+
+    `Tp`, `M`, `rp`, `beta` and `wfrac` can be arrays (or scalars) of
+    broadcastable shapes, e.g., a grid of rotation rates and masses. The
+    integrals over theta are done with broadcasting (theta is the last axis),
+    so all stars are calculated in one call.
+
+    `LnotTp`: the value of "Tp" is the Luminosity (in solar units).
+
+    INPUT: th_res (theta resolution, integer)...
+
+    OUTPUT: (ob, Tp values, Area[cm2]) arrays (broadcasted shape)
+    """
+    Rsun = _phc.Rsun.cgs
+    Msun = _phc.Msun.cgs
+    Lsun = _phc.Lsun.cgs
+    G = _phc.G.cgs
+    sigma = _phc.sigma.cgs
+    Tp, M, rp, beta, wfrac = _np.broadcast_arrays(*[_np.array(x, dtype=float)
+    for x in (Tp, M, rp, beta, wfrac)])
+    M = M * Msun
+    rp = rp * Rsun
+    wfrac = _np.where(wfrac == 0., 1e-9, wfrac)
+    if LnotTp:
+        Tp = (Tp*Lsun/4./_np.pi/rp**2/sigma)**.25
+
+    ths = _np.linspace(_np.pi / 2, 0, th_res)
+    #~ theta as the last axis
+    exp = lambda x: x[..., _np.newaxis]
+
+    def lumf(wfrac):
+        l = _np.sum(_rotrt(ths, exp(wfrac)) ** 2 * _np.sin(ths) * abs(_rotg(
+        ths, exp(wfrac), exp(M), exp(rp))) ** (4 * exp(beta)), axis=-1)
+        return l * ths[-2] * rp ** 2
+
+    C = Tp ** (1. / beta) / abs(G * M / rp ** 2)
+    b = lumf(wfrac)
+    c = lumf(_np.zeros(wfrac.shape) + 0.0001)
+    Cw = (c / b) ** (1. / (4. * beta)) * C
+    ob = _rotrt(_np.pi / 2, wfrac)
+    area = 2 * ths[-2] * _np.sum(2 * _np.pi * _rotrt(ths, exp(wfrac)) ** 2 *
+    _np.sin(ths), axis=-1)
+    return ob, (Cw * abs(_rotg(0., wfrac, M, rp))) ** beta, area*(rp**2)
+
+
 def obsCalc():
     """ Obs. Calculation
 
@@ -1295,6 +1711,9 @@ def obsCalc():
 def readSingleBe(sBfile):
     """ Read the singleBe output
 
+    The whole file is loaded in memory. See `readSingleBeSnaps` for long
+    simulations.
+
     OUTPUT = rgrid, lsig_r, nsnaps, simdays, alpha
     """
 
@@ -1360,6 +1779,77 @@ def readSingleBe(sBfile):
     return rgrid, lsig_r, nsnaps, simdays, alpha
 
 
+def indexSingleBe(sBfile):
+    """ Build the index of the snapshots blocks of a singleBe output.
+
+    The file is read once, line by line (i.e., it is never fully loaded in
+    memory), recording the byte offset of the sigma(r) line and the time of
+    each snapshot. See `readSingleBeSnaps`.
+
+    OUTPUT = offsets (sigma(r) lines), days (snapshots time), rgrid, alpha
+    """
+    hs = 15                     # header size
+    f0 = open(sBfile, 'rb')
+    lines = [f0.readline() for i in range(hs)]
+    alpha = float(lines[0].split()[0])                  # constant alpha parameter
+    rgrid = _np.array(lines[4].split()).astype(float)   # radial grid values
+    offsets = []
+    tausec = []
+    i = 0
+    while True:
+        pos = f0.tell()
+        line = f0.readline()
+        if len(line) == 0:
+            break
+        # Blocks have 9 lines (the variable size ones can be empty); only
+        # the trailing blank lines (empty sigma(r)) are not snapshots
+        if i % 9 == 1:
+            tauline = line                              # tausec in seconds
+        elif i % 9 == 5 and len(line.strip()) > 0:
+            offsets += [pos]
+            tausec += [float(tauline)]
+        i += 1
+    f0.close()
+    return _np.array(offsets), _np.array(tausec)/24/3600, rgrid, alpha
+
+
+def readSingleBeSnaps(sBfile, snaps=None, days=None, index=None):
+    """ Read the sigma(r) of selected snapshots of the singleBe output.
+
+    Only the selected snapshots are parsed: the file is accessed directly at
+    their positions, using the snapshots index (`index` =
+    `indexSingleBe(sBfile)`; it is built if not given).
+
+    | The snapshots can be selected by:
+    | -snaps = index (int), list of indexes, or slice (range and/or stride,
+    |   e.g., `slice(0, None, 10)`). Default: all.
+    | -days = list of times (in days); the nearest snapshots are selected.
+
+    OUTPUT = rgrid, lsig_r (array[nsel, nr]), seldays, alpha
+    """
+    if index is None:
+        index = indexSingleBe(sBfile)
+    offsets, ldays, rgrid, alpha = index
+    isnaps = _np.arange(len(offsets))
+    if days is not None:
+        isnaps = _np.array([_np.abs(ldays-day).argmin() for day in
+        _np.atleast_1d(days)], dtype=int)
+    elif snaps is not None:
+        isnaps = _np.atleast_1d(isnaps[snaps])
+    f0 = open(sBfile, 'rb')
+    lsig_r = None
+    for i in range(len(isnaps)):
+        f0.seek(offsets[isnaps[i]])
+        sig_r = _np.fromstring(f0.readline(), sep=' ')
+        if lsig_r is None:
+            lsig_r = _np.zeros((len(isnaps), len(sig_r)))
+        lsig_r[i] = sig_r
+    f0.close()
+    if lsig_r is None:
+        lsig_r = _np.zeros((0, len(rgrid)))
+    return rgrid, lsig_r, ldays[isnaps], alpha
+
+
 ### MAIN ###
 if __name__ == "__main__":
     pass
@@ -11,7 +11,10 @@ BAstar clase: there is a stand-alone star.
 import os as _os
 import numpy as _np
 import struct as _struct
+import multiprocessing as _mp
+import hashlib as _hashlib
 from glob import glob as _glob
+from collections import OrderedDict as _OrderedDict
 from itertools import product as _product
 import pyhdust.phc as _phc
 import pyhdust as _hdt
@@ -21,6 +24,17 @@ try:
 except:
     print('# Warning! matplotlib module not installed!!!')
 
+try:
+    from scipy.spatial import cKDTree as _cKDTree
+    from scipy import sparse as _sparse
+except:
+    print('# Warning! scipy module not installed!!!')
+
+try:
+    import h5py as _h5py
+except:
+    print('# Warning! h5py module not installed!!!')
+
 __author__ = "Daniel Moser"
 __email__ = "dmfaes@gmail.com"
 
@@ -89,8 +103,19 @@ class BAmod(BAstar):
                 if i == 7:
                     self.cosi = _phc.find_nearest(listpars[i], ctrlarr[i])
     #
-    def getidx(self, minfo):
-        """ Find index of current model in minfo array. """
+    def getidx(self, minfo, index=None):
+        """ Find index of current model in minfo array.
+
+        If `index` (from `BAindex(minfo)`) is given, the model is found with a
+        O(1) lookup and its row number is returned (None if the model is not
+        in the grid). Otherwise, a boolean mask over `minfo` is returned. """
+        if index is not None:
+            pars = [self.M, self.ob, self.Z, self.H, self.sig, self.Rd, self.h]
+            if self.param:
+                pars += [self.n]
+            pars += [self.cosi]
+            self.idx = index.get(tuple([float(x) for x in pars]))
+            return self.idx
         if len(minfo[0])==9:
             self.idx = (minfo[:,0]==self.M) & (minfo[:,1]==self.ob) &\
         (minfo[:,2]==self.Z) & (minfo[:,3]==self.H) & (minfo[:,4]==self.sig) &\
@@ -104,6 +129,21 @@ class BAmod(BAstar):
         return self.idx
 
 
+def BAindex(minfo):
+    """ Build the hashed index of the models of a BeAtlas grid.
+
+    It maps the parameters tuple (M, ob(W), Z, H, sig, Rd, h, *n*, cos(i)) to
+    the row of the model in `minfo`. It should be built once per grid and
+    given to `BAmod.getidx` or `interpolBA`.
+
+    INPUT: minfo (from `readBAsed`)
+
+    OUTPUT: dictionary
+    """
+    minfo = _np.asarray(minfo, dtype=float)
+    return dict(zip([tuple(x) for x in minfo.tolist()], range(len(minfo))))
+
+
 vrots = [[259.759,354.834,417.792,464.549,483.847],\
      [252.050,346.163,406.388,449.818,468.126],\
      [245.127,336.834,399.983,448.076,467.806],\
@@ -226,8 +266,65 @@ def fsedList(fsedlist, param=True):
     return nm*len(listpar[-1]), listpar
     
 
+def _BAsedRows(fsed, lbdarr, lcosi, param=True, ignorelum=False):
+    """ Return the `minfo` and `models` rows of a fullsed2 file (one for each
+    observer) of the BeAtlas SED release. See `createBAsed`.
+
+    An IOError is raised if the log file of the model is not found (unless
+    `ignorelum`).
+
+    OUTPUT: minfo, models (arrays)
+    """
+    mod = BAmod(fsed)
+    nq = 9
+    if not param:
+        nq = 8
+    nlb = len(lbdarr)
+    minfo = _np.zeros((len(lcosi), nq))
+    models = _np.zeros((len(lcosi), nlb))
+    sed2data = _hdt.readfullsed2(fsed)
+    iL = 1.
+    dist = _np.sqrt(4*_np.pi)
+    if not ignorelum:
+        j =  fsed.find('fullsed_mod')
+        modn = fsed[j+11:j+13]
+        log = fsed.replace('fullsed_mod','../mod{0}/mod'.format(modn)).\
+        replace('.sed2','.log')
+        if not _os.path.exists(log):
+            log = _glob(log.replace('../mod{0}/mod'.format(modn),
+            '../mod{0}/*mod'.format(modn)))
+            if len(log) >= 1:
+                log = log[0]
+            else:
+                raise IOError('No log file found for {0}'.format(fsed))
+        f0 = open(log)
+        lines = f0.readlines()
+        f0.close()
+        iL = _phc.fltTxtOccur('L =', lines, seq=2)*_phc.Lsun.cgs
+        dist = 10.*_phc.pc.cgs
+    for j in range(len(lcosi)):
+        #~  M, ob(W), Z, H, sig, Rd, h, *n*, cos(i).
+        if param:
+            minfo[j] = _np.array([ mod.M, mod.ob, mod.Z, mod.H,
+        mod.sig, mod.Rd, mod.h, mod.n, lcosi[j] ]).astype(float)
+        else:
+            minfo[j] = _np.array([ mod.M, mod.ob, mod.Z, mod.H,
+        mod.sig, mod.Rd, mod.h, lcosi[j] ]).astype(float)
+        if len(sed2data[j,:,2]) != nlb:
+            models[j] = _np.interp(lbdarr, sed2data[j,:,2],
+        sed2data[j,:,3])*iL/4/_np.pi/dist**2
+        else:
+            models[j] = sed2data[j,:,3]*iL/4/_np.pi/dist**2
+    return minfo, models
+
+
+def _BAsedRowsPar(args):
+    """ `_BAsedRows` wrapper for `multiprocessing.Pool.imap`. """
+    return _BAsedRows(*args)
+
+
 def createBAsed(fsedlist, xdrpath, lbdarr, param=True, savetxt=False,
-    ignorelum=False):
+    ignorelum=False, saveidx=False):
     """ Create the BeAtlas SED XDR release.
 
     | The file structure:
@@ -247,8 +344,9 @@ def createBAsed(fsedlist, xdrpath, lbdarr, param=True, savetxt=False,
     |   F_lbda/F_bol unit will be given.
 
     Since the grid is not symmetric, there is no index to jump directly to the
-    desired model. So the suggestion is to use the index matrix, or read the
-    file line by line until find the model (if exists).
+    desired model. If `saveidx` == True, a sidecar index file (`xdrpath`.idx)
+    is saved with the byte offset of every model (see `writeBAidx`), and
+    `readBAmodel` or `readBAsubset` can read only the desired models.
     """
     fsedlist.sort()
     nq = 9
@@ -267,40 +365,13 @@ def createBAsed(fsedlist, xdrpath, lbdarr, param=True, savetxt=False,
         mod = BAmod(fsedlist[i])
         #~ Select only `param` matching cases:
         if mod.param == param:
-            sed2data = _hdt.readfullsed2(fsedlist[i])
-            iL = 1.
-            dist = _np.sqrt(4*_np.pi)
-            if not ignorelum:
-                j =  fsedlist[i].find('fullsed_mod')
-                modn = fsedlist[i][j+11:j+13]
-                log = fsedlist[i].replace('fullsed_mod','../mod{0}/mod'.format(modn)).\
-                replace('.sed2','.log')
-                if not _os.path.exists(log):
-                    log = _glob(log.replace('../mod{0}/mod'.format(modn),
-                    '../mod{0}/*mod'.format(modn)))
-                    if len(log) >= 1:
-                        log = log[0]
-                    else:
-                        print('# ERROR! No log file found for {0}'.format(fsedlist[i]))
-                        raise SystemExit(0)
-                f0 = open(log)
-                lines = f0.readlines()
-                f0.close()
-                iL = _phc.fltTxtOccur('L =', lines, seq=2)*_phc.Lsun.cgs
-                dist = 10.*_phc.pc.cgs
-            for j in range(header2[-1]):
-                #~  M, ob(W), Z, H, sig, Rd, h, *n*, cos(i).
-                if param:
-                    minfo[k*header2[-1]+j] = _np.array([ mod.M, mod.ob, mod.Z, mod.H,
-                mod.sig, mod.Rd, mod.h, mod.n, listpar[-1][j] ]).astype(float)
-                else:
-                    minfo[k*header2[-1]+j] = _np.array([ mod.M, mod.ob, mod.Z, mod.H,
-                mod.sig, mod.Rd, mod.h, listpar[-1][j] ]).astype(float)
-                if len(sed2data[j,:,2]) != nlb:
-                    models[k*header2[-1]+j] = _np.interp(lbdarr, sed2data[j,:,2],
-                sed2data[j,:,3])*iL/4/_np.pi/dist**2
-                else:
-                    models[k*header2[-1]+j] = sed2data[j,:,3]*iL/4/_np.pi/dist**2
+            i0 = k*header2[-1]
+            try:
+                minfo[i0:i0+header2[-1]], models[i0:i0+header2[-1]] = \
+                _BAsedRows(fsedlist[i], lbdarr, listpar[-1], param, ignorelum)
+            except IOError as err:
+                print('# ERROR! {0}'.format(err))
+                raise SystemExit(0)
             k += 1
     #
     f0 = open(xdrpath, 'w')
@@ -320,6 +391,8 @@ def createBAsed(fsedlist, xdrpath, lbdarr, param=True, savetxt=False,
         f0.writelines(_struct.pack(stfmt, *_np.array(models[i]).astype(float)))
     f0.close()
     print('# XDR file {0} saved!'.format(xdrpath))
+    if saveidx:
+        writeBAidx(xdrpath, minfo=minfo)
 
     if savetxt:
         f0 = open(xdrpath+'.txt', 'w')
@@ -336,7 +409,301 @@ def createBAsed(fsedlist, xdrpath, lbdarr, param=True, savetxt=False,
     return
     
 
-def readBAsed(xdrpath, quiet=False):
+def createBAsedPar(fsedlist, xdrpath, lbdarr, param=True, ignorelum=False,
+    nproc=None, saveidx=False):
+    """ Create the BeAtlas SED XDR release in parallel.
+
+    It is equivalent to `createBAsed` (same file structure and definitions),
+    but the fullsed2 files are read and reduced by a pool of `nproc`
+    processes (default: number of CPUs). The models are written to the XDR
+    file as soon as they are ready, in the input order, so the full `models`
+    matrix is never kept in memory.
+
+    Errors of the workers (e.g., IOError for a missing log file) are raised
+    in the calling process, and the pool is terminated.
+
+    If `saveidx` == True, the sidecar index file is also saved (see
+    `writeBAidx`).
+
+    INPUT: fsedlist, xdrpath, lbdarr, param, ignorelum, nproc, saveidx
+
+    OUTPUT: *file written (status printed)
+    """
+    fsedlist.sort()
+    nq = 9
+    if not param:
+        nq = 8
+    nm, listpar = fsedList(fsedlist, param=param)
+    header2 = []
+    for vals in listpar:
+        header2 += [len(vals)]
+    nlb = len(lbdarr)
+    header1 = [nq, nlb, nm]
+    args = [(fsed, lbdarr, listpar[-1], param, ignorelum) for fsed in
+    fsedlist if BAmod(fsed).param == param]
+    #
+    f0 = open(xdrpath, 'wb')
+    _np.array(header1, dtype='>i4').tofile(f0)
+    _np.array(header2, dtype='>i4').tofile(f0)
+    for vals in listpar:
+        _np.array(vals, dtype=float).astype('>f4').tofile(f0)
+    _np.array(lbdarr, dtype=float).astype('>f4').tofile(f0)
+    lminfo = []
+    pool = _mp.Pool(nproc)
+    try:
+        for minfo, models in pool.imap(_BAsedRowsPar, args):
+            _np.hstack((minfo, models)).astype('>f4').tofile(f0)
+            if saveidx:
+                lminfo += [minfo]
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.close()
+        pool.join()
+        f0.close()
+    print('# XDR file {0} saved!'.format(xdrpath))
+    if saveidx:
+        writeBAidx(xdrpath, minfo=_np.vstack(lminfo))
+    return
+
+
+def BAxdr2hdf5(xdrpath, h5path=None, chunks=(64, 256), compression='gzip'):
+    """ Convert the BeAtlas SED XDR release to HDF5 (lossless).
+
+    `listpar` (group of datasets), `lbdarr`, `minfo` and `models` are saved as
+    separate datasets. `minfo` and `models` are chunked (`chunks` = (models,
+    lambdas) per chunk) and compressed (with shuffle filter), so reading one
+    model, a set of models or a lambda window costs proportional I/O. See
+    `readBAhdf5`.
+
+    The values are kept as float32 (as in the XDR file).
+
+    INPUT: xdrpath, h5path (default: `xdrpath` + '.hdf5'), chunks,
+    compression
+
+    OUTPUT: *file written (status printed)
+    """
+    if h5path is None:
+        h5path = xdrpath+'.hdf5'
+    nq, nlb, nm, listpar, lbdarr, ixdr = _readBAhdr(xdrpath)
+    minfo, models = readBAsed(xdrpath, quiet=True, mmap=True)[2:]
+    chunks = (min(chunks[0], nm), min(chunks[1], nlb))
+    f0 = _h5py.File(h5path, 'w')
+    f0.attrs['nq'] = nq
+    f0.attrs['nlb'] = nlb
+    f0.attrs['nm'] = nm
+    grp = f0.create_group('listpar')
+    for i in range(nq):
+        grp.create_dataset('{0:02d}'.format(i), data=_np.array(listpar[i],
+        dtype='f4'))
+    f0.create_dataset('lbdarr', data=lbdarr.astype('f4'))
+    dminfo = f0.create_dataset('minfo', (nm, nq), dtype='f4', chunks=(
+    chunks[0], nq), compression=compression, shuffle=True)
+    dmodels = f0.create_dataset('models', (nm, nlb), dtype='f4',
+    chunks=chunks, compression=compression, shuffle=True)
+    for i in range(0, nm, chunks[0]*16):
+        dminfo[i:i+chunks[0]*16] = minfo[i:i+chunks[0]*16]
+        dmodels[i:i+chunks[0]*16] = models[i:i+chunks[0]*16]
+    f0.close()
+    print('# HDF5 file {0} saved!'.format(h5path))
+    return
+
+
+def BAhdf52xdr(h5path, xdrpath, chunk=1000):
+    """ Convert the BeAtlas SED HDF5 file (see `BAxdr2hdf5`) to the XDR
+    release format (lossless).
+
+    INPUT: h5path, xdrpath, chunk (models per writing block)
+
+    OUTPUT: *file written (status printed)
+    """
+    f0 = _h5py.File(h5path, 'r')
+    nq, nlb, nm = [int(f0.attrs[key]) for key in ['nq', 'nlb', 'nm']]
+    listpar = [f0['listpar/{0:02d}'.format(i)][:] for i in range(nq)]
+    f1 = open(xdrpath, 'wb')
+    _np.array([nq, nlb, nm], dtype='>i4').tofile(f1)
+    _np.array([len(vals) for vals in listpar], dtype='>i4').tofile(f1)
+    for vals in listpar:
+        vals.astype('>f4').tofile(f1)
+    f0['lbdarr'][:].astype('>f4').tofile(f1)
+    for i in range(0, nm, chunk):
+        _np.hstack((f0['minfo'][i:i+chunk], f0['models'][i:i+chunk])).\
+        astype('>f4').tofile(f1)
+    f1.close()
+    f0.close()
+    print('# XDR file {0} saved!'.format(xdrpath))
+    return
+
+
+def readBAhdf5(h5path, quiet=False):
+    """ Read the BeAtlas SED HDF5 file (see `BAxdr2hdf5`).
+
+    `minfo` and `models` are returned as (lazy) h5py datasets: only the
+    slices used are read (e.g., `models[:, i0:i1]` for a lambda window, or
+    `models[idx]` for a set of models, with sorted `idx`). Use `[:]` to load
+    them in memory.
+
+    INPUT: h5path
+
+    | OUTPUT: listpar, lbdarr, minfo, models
+    | (list of mods parameters, lambda array (um), mods index, mods flux)
+    """
+    f0 = _h5py.File(h5path, 'r')
+    nq = int(f0.attrs['nq'])
+    listpar = [f0['listpar/{0:02d}'.format(i)][:].astype(float) for i in
+    range(nq)]
+    lbdarr = f0['lbdarr'][:].astype(float)
+    if not quiet:
+        print('# HDF5 {0} opened!'.format(h5path))
+    return listpar, lbdarr, f0['minfo'], f0['models']
+
+
+def _readBAhdr(xdrpath):
+    """ Read the header of the BeAtlas SED release (i.e., everything before
+    the models block).
+
+    OUTPUT: nq, nlb, nm, listpar, lbdarr, ixdr (byte offset of the models)
+    """
+    f0 = open(xdrpath, 'rb')
+    # Python ints: int32 products overflow for grids larger than 2 GB
+    nq, nlb, nm = [int(n) for n in _np.fromfile(f0, dtype='>i4', count=3)]
+    header = [int(n) for n in _np.fromfile(f0, dtype='>i4', count=nq)]
+    listpar = [[] for i in range(nq)]
+    for i in range(nq):
+        listpar[i] = _np.fromfile(f0, dtype='>f4', count=header[i]).\
+        astype(float)
+    lbdarr = _np.fromfile(f0, dtype='>f4', count=nlb).astype(float)
+    ixdr = f0.tell()
+    f0.close()
+    return nq, nlb, nm, listpar, lbdarr, ixdr
+
+
+def writeBAidx(xdrpath, minfo=None):
+    """ Save the sidecar index file (`xdrpath`.idx) of a BeAtlas SED release.
+
+    | The file structure (big-endian):
+    | -n_quantities, n_lbd, n_models (int32)
+    | -XDR modification time (s) and size (bytes) (int64)
+    | -Loop: model values (n_models*n_quantities float32)
+    | -Loop: model byte offset in the XDR (n_models int64)
+
+    If `minfo` is not given, it is read from the XDR file (memory-mapped).
+
+    INPUT: xdrpath, minfo
+
+    OUTPUT: *file written (status printed)
+    """
+    nq, nlb, nm, listpar, lbdarr, ixdr = _readBAhdr(xdrpath)
+    if minfo is None:
+        minfo = readBAsed(xdrpath, quiet=True, mmap=True)[2]
+    offsets = ixdr + _np.arange(nm, dtype=_np.int64)*(nq+nlb)*4
+    f0 = open(xdrpath+'.idx', 'wb')
+    _np.array([nq, nlb, nm], dtype='>i4').tofile(f0)
+    _np.array(_BAidxstamp(xdrpath), dtype='>i8').tofile(f0)
+    _np.asarray(minfo, dtype=float).astype('>f4').tofile(f0)
+    offsets.astype('>i8').tofile(f0)
+    f0.close()
+    print('# Index file {0} saved!'.format(xdrpath+'.idx'))
+    return
+
+
+def _BAidxstamp(xdrpath):
+    """ XDR modification time (int) and size, saved in its index file. """
+    fstat = _os.stat(xdrpath)
+    return [int(fstat.st_mtime), fstat.st_size]
+
+
+def _BAidxvalid(xdrpath):
+    """ Check if the sidecar index file exists and matches its XDR file (same
+    modification time, size and header). """
+    idxpath = xdrpath+'.idx'
+    if not _os.path.exists(idxpath):
+        return False
+    nq, nlb, nm = _readBAhdr(xdrpath)[:3]
+    f0 = open(idxpath, 'rb')
+    hdr = [int(n) for n in _np.fromfile(f0, dtype='>i4', count=3)]
+    stamp = [int(n) for n in _np.fromfile(f0, dtype='>i8', count=2)]
+    f0.close()
+    return hdr == [nq, nlb, nm] and stamp == _BAidxstamp(xdrpath) and \
+    _os.path.getsize(idxpath) == 3*4 + 2*8 + nm*nq*4 + nm*8
+
+
+def readBAidx(xdrpath):
+    """ Read the sidecar index file of a BeAtlas SED release. If it does not
+    exist, or if it does not match the XDR file anymore (modification time,
+    size or header), it is (re)created (see `writeBAidx`).
+
+    INPUT: xdrpath (of the XDR file, not the index)
+
+    OUTPUT: dictionary {model values tuple: byte offset}, nq, nlb
+    """
+    if not _BAidxvalid(xdrpath):
+        print('# Warning: no valid index file for {0}. Creating it...'.\
+        format(xdrpath))
+        writeBAidx(xdrpath)
+    f0 = open(xdrpath+'.idx', 'rb')
+    nq, nlb, nm = [int(n) for n in _np.fromfile(f0, dtype='>i4', count=3)]
+    _np.fromfile(f0, dtype='>i8', count=2)
+    minfo = _np.fromfile(f0, dtype='>f4', count=nm*nq).reshape((nm, nq))
+    offsets = _np.fromfile(f0, dtype='>i8', count=nm)
+    f0.close()
+    index = dict(zip([tuple(x) for x in minfo.astype(float).tolist()],
+    offsets.tolist()))
+    return index, nq, nlb
+
+
+def readBAsubset(xdrpath, lparams, index=None, quiet=False):
+    """ Read only the selected models of a BeAtlas SED release.
+
+    `lparams` is a list of models values (M, ob(W), Z, H, sig, Rd, h, *n*,
+    cos(i)). The file is accessed directly at the position of each model,
+    using the sidecar index (`index` = `readBAidx(xdrpath)`; it is read, and
+    rebuilt if stale, if not given; an `index` kept in memory must be read
+    again if the XDR file changes). Models not found in the grid are
+    skipped (warning printed).
+
+    INPUT: xdrpath, lparams
+
+    OUTPUT: minfo, models (arrays of the models found)
+    """
+    if index is None:
+        index = readBAidx(xdrpath)
+    index, nq, nlb = index
+    offsets = []
+    for params in lparams:
+        key = tuple(_np.array(params, dtype='>f4').astype(float).tolist())
+        if key in index:
+            offsets += [index[key]]
+        elif not quiet:
+            print('# Warning: model {0} not found in {1}!'.format(params,
+            xdrpath))
+    minfo = _np.zeros((len(offsets), nq))
+    models = _np.zeros((len(offsets), nlb))
+    f0 = open(xdrpath, 'rb')
+    for i in range(len(offsets)):
+        f0.seek(offsets[i])
+        data = _np.fromfile(f0, dtype='>f4', count=nq+nlb)
+        minfo[i] = data[:nq]
+        models[i] = data[nq:]
+    f0.close()
+    return minfo, models
+
+
+def readBAmodel(xdrpath, params, index=None):
+    """ Read a single model of a BeAtlas SED release. See `readBAsubset`.
+
+    INPUT: xdrpath, params (M, ob(W), Z, H, sig, Rd, h, *n*, cos(i))
+
+    OUTPUT: model flux array (None if the model is not found)
+    """
+    minfo, models = readBAsubset(xdrpath, [params], index=index)
+    if len(models) == 0:
+        return None
+    return models[0]
+
+
+def readBAsed(xdrpath, quiet=False, mmap=False):
     """ Read the BeAtlas SED release.
 
     | Definitions:
@@ -346,12 +713,31 @@ def readBAsed(xdrpath, quiet=False):
     | -The models flux are given in ergs/s/cm2/um. If ignorelum==True in the
     |   XDR creation, F_lbda/F_bol unit will be given.
 
+    If `mmap` == True, the models block is memory-mapped (read-only, big-endian
+    float32) and `minfo` and `models` are returned as lazy views of the file.
+    Only the rows actually used are read from disk (and copied if operated).
+    This is the recommended way to open large (GB) grids.
+
     INPUT: xdrpath
 
     | OUTPUT: listpar, lbdarr, minfo, models 
     | (list of mods parameters, lambda array (um), mods index, mods flux)
     """
-    f = open(xdrpath).read()
+    if mmap:
+        nq, nlb, nm, listpar, lbdarr, ixdr = _readBAhdr(xdrpath)
+        fsize = _os.path.getsize(xdrpath)
+        if ixdr+nm*(nq+nlb)*4 == fsize:
+            if not quiet:
+                print('# XDR {0} mapped!'.format(xdrpath))
+        else:
+            print('# Warning: XDR {0} size does not match its header!'.\
+            format(xdrpath))
+            print('# length difference is {0}'.format( (fsize-ixdr)/4 -
+            nm*(nq+nlb) ))
+        models = _np.memmap(xdrpath, dtype='>f4', mode='r', offset=ixdr,
+        shape=(nm, nq+nlb))
+        return listpar, lbdarr, models[:,0:nq], models[:,nq:]
+    f = open(xdrpath, 'rb').read()
     ixdr=0
     #~ 
     npxs = 3
@@ -393,13 +779,84 @@ def readBAsed(xdrpath, quiet=False):
     return listpar, lbdarr, models[:,0:nq], models[:,nq:]
 
 
-def interpolBA(params, ctrlarr, lparams, minfo, models, param=True):
+def createBAphot(xdrpath, filters, phtpath=None, chunk=1000):
+    """ Create the synthetic photometry grid of a BeAtlas SED release.
+
+    The band integrated flux (see `hdt.doFilterConv`) of every model is
+    calculated once for each filter of `filters` (names of the `filters/`
+    folder files) and saved as a companion XDR file (`phtpath`; default:
+    `xdrpath` + '.phot').
+
+    The companion file has the same structure of the SED release, with the
+    filters effective wavelengths in the place of the lambda array and the
+    filters fluxes in the place of the SEDs. So, it can be read with
+    `readBAsed` (or `readBAphot`) and interpolated with `interpolBA` or
+    `interpolBAbatch` directly. The filters names are saved in the
+    `phtpath`.filters file.
+
+    The models are processed in blocks of `chunk` rows (memory-mapped).
+
+    INPUT: xdrpath, filters (list of strings), phtpath, chunk
+
+    OUTPUT: *files written (status printed)
+    """
+    if phtpath is None:
+        phtpath = xdrpath+'.phot'
+    nq, nlb, nm, listpar, lbdarr, ixdr = _readBAhdr(xdrpath)
+    minfo, models = readBAsed(xdrpath, quiet=True, mmap=True)[2:]
+    weights = _hdt.doFilterMatrix(lbdarr, filters)
+    leff = _np.zeros(len(filters))
+    for i in range(len(filters)):
+        if _np.sum(weights[:,i]) == 0:
+            print('# Warning: filter {0} is out of the lambda range!'.\
+            format(filters[i]))
+        else:
+            leff[i] = _np.sum(weights[:,i]*lbdarr)/_np.sum(weights[:,i])
+    #
+    f0 = open(phtpath, 'wb')
+    _np.array([nq, len(filters), nm], dtype='>i4').tofile(f0)
+    _np.array([len(vals) for vals in listpar], dtype='>i4').tofile(f0)
+    for vals in listpar:
+        _np.array(vals, dtype=float).astype('>f4').tofile(f0)
+    leff.astype('>f4').tofile(f0)
+    for i in range(0, nm, chunk):
+        phot = _np.dot(_np.asarray(models[i:i+chunk], dtype=float), weights)
+        _np.hstack((minfo[i:i+chunk], phot)).astype('>f4').tofile(f0)
+    f0.close()
+    f0 = open(phtpath+'.filters', 'w')
+    f0.writelines('{0}\n'.format(filt) for filt in filters)
+    f0.close()
+    print('# Photometry file {0} saved!'.format(phtpath))
+    return
+
+
+def readBAphot(phtpath, quiet=False, mmap=False):
+    """ Read the BeAtlas synthetic photometry grid (see `createBAphot`).
+
+    INPUT: phtpath
+
+    | OUTPUT: listpar, filters, leff, minfo, phot
+    | (list of mods parameters, filters names, filters effective wavelengths
+    | (um), mods index, mods filters fluxes)
+    """
+    listpar, leff, minfo, phot = readBAsed(phtpath, quiet=quiet, mmap=mmap)
+    f0 = open(phtpath+'.filters')
+    filters = [line.strip() for line in f0.readlines()]
+    f0.close()
+    return listpar, filters, leff, minfo, phot
+
+
+def interpolBA(params, ctrlarr, lparams, minfo, models, param=True,
+    index=None):
     """ Interpola os `modelos` para os parametros `params` 
 
     | -params = from emcee minimization
     | -ctrlarr = the fixed value of M, ob(W), Z, H, sig, Rd, h, *n*, cos(i).
     |            If it is not fixed, use np.NaN.
     | -Parametric disk model default (`param` == True).
+    | -index = hashed models index (`BAindex(minfo)`). If given, the models
+    |          at the corners are found in O(1), independently of the grid
+    |          size. Recommended for MCMC runs.
 
     This function always returns a valid result (i.e., extrapolations from the
     nearest values are always on).
@@ -430,9 +887,14 @@ def interpolBA(params, ctrlarr, lparams, minfo, models, param=True):
         idx = _np.isnan(allpars)
         allpars[idx] = prod
         mod.build(allpars, lparams)
-        idx = mod.getidx(minfo)
-        if _np.sum(idx) == 0:
-            return _np.zeros(nlb)
+        if index is None:
+            idx = mod.getidx(minfo)
+            if _np.sum(idx) == 0:
+                return _np.zeros(nlb)
+        else:
+            idx = mod.getidx(minfo, index=index)
+            if idx is None:
+                return _np.zeros(nlb)
         outmodels[j] = models[idx]
         j+= 1
     X0 = parlims[:,0]
@@ -440,6 +902,373 @@ def interpolBA(params, ctrlarr, lparams, minfo, models, param=True):
     return _phc.interLinND(params, X0, X1, outmodels)
 
 
+def BAidxgrid(lparams, minfo):
+    """ Build the dense table of models rows of a BeAtlas grid.
+
+    The table has one axis per parameter (with the size of each `lparams`
+    list) and contains the row of the corresponding model in `minfo`, or -1 if
+    the model is missing ('Non-squared grid'). It should be built once per grid
+    and given to `interpolBAbatch`. Each `minfo` value is matched to the
+    nearest `lparams` node (relative tolerance 1e-5, as `minfo` is float32);
+    ValueError is raised if there is none.
+
+    INPUT: lparams, minfo (from `readBAsed`)
+
+    OUTPUT: integer array
+    """
+    minfo = _np.asarray(minfo, dtype=float)
+    table = -_np.ones([len(vals) for vals in lparams], dtype=int)
+    gidx = []
+    for i in range(len(lparams)):
+        vals = _np.asarray(lparams[i], dtype=float)
+        # minfo is float32 in the XDR files: take the nearest node
+        j = _np.clip(_np.searchsorted(vals, minfo[:,i]), 0, len(vals)-1)
+        jm = _np.clip(j-1, 0, len(vals)-1)
+        j = _np.where(_np.abs(vals[jm]-minfo[:,i]) <= _np.abs(vals[j]-
+        minfo[:,i]), jm, j)
+        bad = _np.abs(vals[j]-minfo[:,i]) > 1e-5*_np.abs(minfo[:,i])+1e-30
+        if _np.any(bad):
+            raise ValueError('Parameter {0} value {1} of model {2} is not in '
+            'lparams!'.format(i, minfo[bad,i][0], _np.where(bad)[0][0]))
+        gidx.append(j)
+    table[tuple(gidx)] = _np.arange(len(minfo))
+    return table
+
+
+def _BAcorners(params, ctrlarr, lparams, table, param=True):
+    """ Return the corners models rows and multilinear weights of a set of
+    parameters vectors. See `interpolBAbatch`.
+
+    OUTPUT: rows (nwalkers, 2**ndim), weights (nwalkers, 2**ndim), valid
+    (nwalkers; False if a corner model is missing)
+    """
+    nq = 9
+    if not param:
+        nq = 8
+    if len(ctrlarr) != nq:
+        print('# ERROR in ctrlarr!!')
+        return
+    ctrlarr = _np.array(ctrlarr, dtype=float)
+    free = _np.where(_np.isnan(ctrlarr))[0]
+    params = _np.atleast_2d(params)[:,:len(free)]
+    nw = len(params)
+    #~ Bracketing indices and weights
+    i0 = _np.zeros((nw, nq), dtype=int)
+    wgt = _np.ones((nw, len(free)))
+    for i in range(nq):
+        lpar = _np.array(lparams[i], dtype=float)
+        if i not in free:
+            i0[:,i] = _np.abs(lpar-ctrlarr[i]).argmin()
+            continue
+        j = list(free).index(i)
+        k = _np.searchsorted(lpar, params[:,j], side='right')
+        k = _np.clip(k, 1, len(lpar)-1)
+        i0[:,i] = k-1
+        wgt[:,j] = (params[:,j]-lpar[k-1])/(lpar[k]-lpar[k-1])
+    #~ Corners: rows and weights
+    corners = _np.array(list(_product(*[[0,1]]*len(free))), dtype=int)
+    cidx = _np.repeat(i0[:,_np.newaxis,:], len(corners), axis=1)
+    cidx[:,:,free] += corners
+    rows = table[tuple(cidx.transpose(2,0,1))]
+    cwgt = _np.prod(_np.where(corners, wgt[:,_np.newaxis,:],
+    1-wgt[:,_np.newaxis,:]), axis=2)
+    valid = _np.all(rows >= 0, axis=1)
+    return rows, cwgt, valid
+
+
+class BAcells(object):
+    """ Completeness map of the cells of a BeAtlas grid.
+
+    The cells are the hypercubes of the grid along the free parameters of
+    `ctrlarr` (np.NaN values), with the other parameters fixed. A cell is
+    complete (valid) if all its corner models are in the grid. A KD-tree of
+    the complete cells (in grid index units) is built to find the nearest one
+    of any point.
+
+    It should be created once per grid and `ctrlarr`, and given to
+    `interpolBAbatch` (`cells` keyword).
+    """
+    def __init__(self, ctrlarr, lparams, minfo, param=True, table=None):
+        """ Class initialiser """
+        if table is None:
+            table = BAidxgrid(lparams, minfo)
+        ctrlarr = _np.array(ctrlarr, dtype=float)
+        self.free = _np.where(_np.isnan(ctrlarr))[0]
+        sel = []
+        for i in range(len(ctrlarr)):
+            if i in self.free:
+                sel += [slice(None)]
+            else:
+                sel += [_np.abs(_np.array(lparams[i])-ctrlarr[i]).argmin()]
+        sub = table[tuple(sel)] >= 0
+        self.lpars = [_np.array(lparams[i], dtype=float) for i in self.free]
+        ncells = [len(lpar)-1 for lpar in self.lpars]
+        self.complete = _np.ones(ncells, dtype=bool)
+        for prod in _product(*[[0,1]]*len(ncells)):
+            self.complete &= sub[tuple([slice(prod[j], prod[j]+ncells[j]) for
+            j in range(len(ncells))])]
+        self.centers = _np.argwhere(self.complete)
+        self.tree = None
+        if len(self.centers) > 0:
+            self.tree = _cKDTree(self.centers+.5)
+    #
+    def cellidx(self, params):
+        """ Return the cells indices of the parameters vectors (nwalkers,
+        ndim). Points out of the grid are assigned to the nearest border
+        cell (as in the interpolation). """
+        params = _np.atleast_2d(params)[:,:len(self.free)]
+        cidx = _np.zeros(params.shape, dtype=int)
+        for j in range(len(self.free)):
+            k = _np.searchsorted(self.lpars[j], params[:,j], side='right')
+            cidx[:,j] = _np.clip(k, 1, len(self.lpars[j])-1)-1
+        return cidx
+    #
+    def isvalid(self, params):
+        """ Check if the parameters vectors (nwalkers, ndim) are inside
+        complete cells, i.e., if they can be interpolated.
+
+        OUTPUT: boolean array (nwalkers) """
+        return self.complete[tuple(self.cellidx(params).T)]
+    #
+    def nearest(self, params):
+        """ Move the parameters vectors (nwalkers, ndim) that are not inside
+        complete cells to the closest point of the nearest complete cell.
+        Valid vectors are not changed.
+
+        OUTPUT: (nwalkers, ndim) array """
+        params = _np.array(_np.atleast_2d(params)[:,:len(self.free)],
+        dtype=float)
+        valid = self.isvalid(params)
+        if _np.all(valid) or self.tree is None:
+            return params
+        gidx = _np.array([_np.interp(params[~valid,j], self.lpars[j],
+        _np.arange(len(self.lpars[j]))) for j in range(len(self.free))]).T
+        cells = self.centers[self.tree.query(gidx)[1]]
+        for j in range(len(self.free)):
+            lo = self.lpars[j][cells[:,j]]
+            hi = self.lpars[j][cells[:,j]+1]
+            #~ The upper border belongs to the next cell
+            params[~valid,j] = _np.clip(params[~valid,j], lo, hi-(hi-lo)*1e-9)
+        return params
+
+
+def interpolBAbatch(params, ctrlarr, lparams, minfo, models, param=True,
+    table=None, cells=None):
+    """ Vectorized version of `interpolBA` for a set of parameters vectors.
+
+    | -params = (nwalkers, ndim) array (e.g., emcee walkers positions)
+    | -ctrlarr = the fixed value of M, ob(W), Z, H, sig, Rd, h, *n*, cos(i).
+    |            If it is not fixed, use np.NaN.
+    | -Parametric disk model default (`param` == True).
+    | -table = models rows table (`BAidxgrid(lparams, minfo)`). It is built
+    |          if not given, but this should be avoided inside MCMC loops.
+    | -cells = completeness map (`BAcells(ctrlarr, lparams, minfo)`). If
+    |          given, the vectors inside incomplete cells are interpolated at
+    |          the nearest point of the nearest complete cell.
+
+    The bracketing indices and the multilinear (log space) weights are
+    calculated at once for all vectors, so it can be used with emcee
+    `vectorize=True` option. Points out of the grid are extrapolated from the
+    nearest cell.
+
+    If it is a 'Non-squared grid' (asymmetric), it will return a zero array for
+    the vectors with a missing corner model (if `cells` is not given).
+
+    OUTPUT: (nwalkers, nlb) array
+    """
+    if table is None:
+        table = BAidxgrid(lparams, minfo)
+    if cells is not None:
+        params = cells.nearest(params)
+    corners = _BAcorners(params, ctrlarr, lparams, table, param=param)
+    if corners is None:
+        return
+    rows, cwgt, valid = corners
+    nlb = _np.shape(models)[1]
+    outmodels = _np.zeros((len(rows), nlb))
+    if _np.sum(valid) > 0:
+        F = _np.log(_np.asarray(models[rows[valid].flatten()], dtype=float))
+        F = F.reshape((-1, rows.shape[1], nlb))
+        outmodels[valid] = _np.exp(_np.einsum('wc,wcl->wl', cwgt[valid], F))
+    return outmodels
+
+
+def BApca(models, ncomp=20, chunk=1000, quiet=False):
+    """ Build the PCA compressed representation of the BeAtlas SEDs.
+
+    The log of the models fluxes is decomposed in a truncated basis of `ncomp`
+    principal components. Each model is then represented by its `ncomp`
+    coefficients:
+
+    log(models) ~= mean + dot(coeffs, basis)
+
+    `models` can be memory-mapped (`readBAsed(..., mmap=True)`); it is read in
+    blocks of `chunk` rows. The fluxes must be > 0.
+
+    The reconstruction error report (explained variance and relative flux
+    errors) is printed if `quiet` == False.
+
+    INPUT: models (from `readBAsed`), ncomp, chunk, quiet
+
+    OUTPUT: mean (nlb), basis (ncomp, nlb), coeffs (nm, ncomp), relerr (nm;
+    maximum relative flux error of each model)
+    """
+    nm, nlb = _np.shape(models)
+    mean = _np.zeros(nlb)
+    for i in range(0, nm, chunk):
+        mean += _np.sum(_np.log(_np.asarray(models[i:i+chunk], dtype=float)),
+        axis=0)
+    mean /= nm
+    cov = _np.zeros((nlb, nlb))
+    for i in range(0, nm, chunk):
+        X = _np.log(_np.asarray(models[i:i+chunk], dtype=float)) - mean
+        cov += _np.dot(X.T, X)
+    eigval, eigvec = _np.linalg.eigh(cov)
+    eigval = eigval[::-1]
+    basis = eigvec[:,::-1][:,:ncomp].T
+    coeffs = _np.zeros((nm, ncomp))
+    relerr = _np.zeros(nm)
+    for i in range(0, nm, chunk):
+        X = _np.log(_np.asarray(models[i:i+chunk], dtype=float)) - mean
+        coeffs[i:i+chunk] = _np.dot(X, basis.T)
+        relerr[i:i+chunk] = _np.max(_np.abs(_np.expm1(_np.dot(coeffs[i:i+chunk],
+        basis) - X)), axis=1)
+    if not quiet:
+        print('# PCA: {0} components of {1} lambdas ({2:.1f}x smaller)'.\
+        format(ncomp, nlb, nm*nlb/float(nm*ncomp+(ncomp+1)*nlb)))
+        print('# Explained variance = {0:.6f}'.format(_np.sum(eigval[:ncomp])/
+        _np.sum(eigval)))
+        print('# Relative flux error: median = {0:.2e}, max = {1:.2e}'.\
+        format(_np.median(relerr), _np.max(relerr)))
+    return mean, basis, coeffs, relerr
+
+
+def interpolBApca(params, ctrlarr, lparams, minfo, pca, param=True,
+    table=None, retcoeffs=False):
+    """ Interpolate the BeAtlas PCA compressed models (see `BApca`).
+
+    | -params = (nwalkers, ndim) array
+    | -ctrlarr = the fixed value of M, ob(W), Z, H, sig, Rd, h, *n*, cos(i).
+    |            If it is not fixed, use np.NaN.
+    | -pca = (mean, basis, coeffs) from `BApca`
+    | -table = models rows table (`BAidxgrid(lparams, minfo)`)
+
+    The coefficients (and not the spectra) are interpolated. Since the
+    coefficients are a linear projection of the log fluxes, this is the same
+    multilinear log space interpolation of `interpolBAbatch`, at O(ncomp)
+    cost. If `retcoeffs` == True, the coefficients are returned instead of
+    the reconstructed SEDs.
+
+    The vectors with a missing corner model return zero arrays.
+
+    OUTPUT: (nwalkers, nlb) array (or (nwalkers, ncomp) coefficients)
+    """
+    mean, basis, coeffs = pca[:3]
+    if table is None:
+        table = BAidxgrid(lparams, minfo)
+    corners = _BAcorners(params, ctrlarr, lparams, table, param=param)
+    if corners is None:
+        return
+    rows, cwgt, valid = corners
+    outcoeffs = _np.einsum('wc,wck->wk', cwgt, coeffs[rows])
+    if retcoeffs:
+        outcoeffs[~valid] = 0.
+        return outcoeffs
+    outmodels = _np.zeros((len(rows), len(mean)))
+    outmodels[valid] = _np.exp(mean + _np.dot(outcoeffs[valid], basis))
+    return outmodels
+
+
+class BAresamp(object):
+    """ Resampler of BeAtlas models to observed wavelengths arrays.
+
+    The (sparse) matrix that takes the models from the grid `lbdarr` to an
+    observed lambda array is built once and cached (by the hash of the
+    observed array; only the last `maxcache` used matrices are kept). Then it is applied to a set of models (nmodels, nlb) with
+    a single sparse matrix product.
+
+    | Two modes:
+    | -conserve=False: linear interpolation (as `numpy.interp`);
+    | -conserve=True: flux conserving binning, i.e., the average flux of the
+    |  models bins inside each observed bin (bins limits are the middle
+    |  points of the lambda arrays).
+
+    .. code::
+
+        >>> resamp = BAresamp(lbdarr)
+        >>> obsmodels = resamp(models, lbdobs)
+    """
+    def __init__(self, lbdarr, maxcache=32):
+        """ Class initialiser """
+        self.lbdarr = _np.array(lbdarr, dtype=float)
+        self.maxcache = maxcache
+        self.cache = _OrderedDict()
+    #
+    def __call__(self, models, lbdobs, conserve=False):
+        """ Return the models resampled at `lbdobs`.
+
+        OUTPUT: (nmodels, nobs) array """
+        M = self.matrix(lbdobs, conserve=conserve)
+        models = _np.asarray(models, dtype=float)
+        if models.ndim == 1:
+            return M.dot(models)
+        return M.dot(models.T).T
+    #
+    def matrix(self, lbdobs, conserve=False):
+        """ Return the cached (nobs, nlb) resampling matrix of `lbdobs`.
+        """
+        lbdobs = _np.ascontiguousarray(lbdobs, dtype=float)
+        key = (_hashlib.md5(lbdobs.tobytes()).hexdigest(), conserve)
+        if key in self.cache:
+            self.cache[key] = self.cache.pop(key)
+        else:
+            if conserve:
+                self.cache[key] = self._binmatrix(lbdobs)
+            else:
+                self.cache[key] = self._interpmatrix(lbdobs)
+            while len(self.cache) > self.maxcache:
+                self.cache.popitem(last=False)
+        return self.cache[key]
+    #
+    def clear(self):
+        """ Clear the matrices cache. """
+        self.cache = _OrderedDict()
+    #
+    def _interpmatrix(self, lbdobs):
+        lbd = self.lbdarr
+        nobs = len(lbdobs)
+        k = _np.clip(_np.searchsorted(lbd, lbdobs), 1, len(lbd)-1)
+        t = _np.clip((lbdobs-lbd[k-1])/(lbd[k]-lbd[k-1]), 0., 1.)
+        rows = _np.hstack((_np.arange(nobs), _np.arange(nobs)))
+        cols = _np.hstack((k-1, k))
+        vals = _np.hstack((1-t, t))
+        return _sparse.csr_matrix((vals, (rows, cols)), shape=(nobs,
+        len(lbd)))
+    #
+    def _binmatrix(self, lbdobs):
+        def edges(x):
+            mid = (x[1:]+x[:-1])/2.
+            return _np.hstack((x[0]-(mid[0]-x[0]), mid, x[-1]+(x[-1]-mid[-1])))
+        medg = edges(self.lbdarr)
+        oedg = edges(lbdobs)
+        rows = []
+        cols = []
+        vals = []
+        for i in range(len(lbdobs)):
+            j0 = max(_np.searchsorted(medg, oedg[i], side='right')-1, 0)
+            j1 = min(_np.searchsorted(medg, oedg[i+1]), len(self.lbdarr))
+            j = _np.arange(j0, j1)
+            ovlp = _np.minimum(medg[j+1], oedg[i+1]) - _np.maximum(medg[j],
+            oedg[i])
+            idx = ovlp > 0
+            if _np.sum(ovlp[idx]) > 0:
+                rows += [i]*_np.sum(idx)
+                cols += list(j[idx])
+                vals += list(ovlp[idx]/_np.sum(ovlp[idx]))
+        return _sparse.csr_matrix((vals, (rows, cols)), shape=(len(lbdobs),
+        len(self.lbdarr)))
+
+
 def breakJob(n, file):
 	""" Break the jobs/jobs_Project_modn.sh into n files 
 	../jobs_Project_modn_##.txt to be used with `dispara` """
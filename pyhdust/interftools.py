@@ -94,10 +94,96 @@ def imshowl(img, cmap='gist_heat'):
     return
 
 
-def readmap(file, quiet=False):
+class MapData(object):
+    """ Memory-mapped (zero-copy) data of a *Hdust* MAP or MAPS file.
+
+    It is indexed as the `data` array of `readmap`, i.e.,
+    data[nimgs,nobs,nlbd,ny,nx,dfact] (.map, dfact = 7) or
+    data[nimgs,nobs,nlbd,ny,nx] (.maps). Only the requested slices are read
+    from the file (and converted to float64). The total flux component
+    (0) is computed only for these slices.
+
+    Example: `data[zoom, obs, :, :, :, 0]` is the total flux images of all
+    wavelengths of the observer `obs`.
+    """
+    def __init__(self, file, offset, shape):
+        self.file = file
+        self._mm = _np.memmap(file, dtype='>f4', mode='r', offset=offset,
+        shape=shape)
+        if len(shape) == 6:
+            self.shape = shape[:5] + (shape[5]+1,)
+        else:
+            self.shape = shape
+        self.ndim = len(self.shape)
+        self.dtype = _np.dtype(float)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if Ellipsis in [k for k in key if not isinstance(k, _np.ndarray)]:
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),)*(self.ndim-len(key)+1) + \
+            key[i+1:]
+        key = key + (slice(None),)*(self.ndim-len(key))
+        # the file is read in the bounding box of the indexes
+        box, sub = zip(*[self._boxkey(key[i], self.shape[i]) for i in
+        range(5)])
+        mmbox = self._mm[box]
+        if self.ndim == 5:
+            return _np.array(mmbox[sub], dtype=float)
+        comps = _np.arange(self.shape[5])[key[5]]
+        if isinstance(key[5], slice):
+            ckey = slice(None)
+        else:
+            ckey = comps - comps.min() if _np.ndim(comps) > 0 else 0
+            comps = _np.arange(_np.min(comps), _np.max(comps)+1)
+        data = _np.empty(mmbox.shape[:-1] + (_np.size(comps),))
+        for i, comp in enumerate(_np.atleast_1d(comps)):
+            data[..., i] = self._comp(mmbox, comp)
+        return data[sub + (ckey,)]
+
+    @staticmethod
+    def _boxkey(k, n):
+        """ Bounding slice of the index `k` (axis of size `n`) and the
+        index relative to it. """
+        if isinstance(k, slice):
+            return k, slice(None)
+        idx = _np.asarray(k)
+        if idx.dtype == bool:
+            idx = _np.nonzero(idx)[0]
+        idx = _np.where(idx < 0, idx+n, idx)
+        if idx.size == 0:
+            return slice(0, 0), idx
+        i0 = int(idx.min())
+        if idx.ndim == 0:
+            return slice(i0, i0+1), 0
+        return slice(i0, int(idx.max())+1), idx-i0
+
+    def _comp(self, sub, comp):
+        """ Component `comp` of the memory-mapped slice `sub`. """
+        if comp == 0:
+            return sub[..., 0].astype(float) + sub[..., 1] + sub[..., 2]
+        return sub[..., comp-1].astype(float)
+
+    def __array__(self, dtype=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
+
+
+@_phc.filecache
+def readmap(file, quiet=False, mmap=False):
     """
     Read *Hdust* MAP or MAPS files.
 
+    If `mmap`, `data` is a `MapData` object: the file is memory-mapped and
+    the images are read only when indexed (i.e., no full copy of the file in
+    memory).
+
     `mapimg`: extract this component from the *.map* file.
 
         - 0 = total flux
@@ -127,6 +213,8 @@ def readmap(file, quiet=False):
     else:
         print('# ERROR: This is not a HDUST valid image!')
         return
+    if mmap:
+        return _readmapmm(file, dfact, quiet=quiet)
     f = open(file).read()
     #
     ixdr=0
@@ -196,6 +284,36 @@ def readmap(file, quiet=False):
     return data, obslist, lbdc, Ra, xmax
 
 
+def _readmapmm(file, dfact, quiet=False):
+    """ `readmap` with memory-mapped data (see `MapData`). """
+    f0 = open(file, 'rb')
+    nobs, lnum, nx, ny = _struct.unpack('>4l', f0.read(4*4))
+    Ra, Rstar, Lratio, xmax = _struct.unpack('>4f', f0.read(4*4))
+    nf = _struct.unpack('>f', f0.read(1*4))[0]
+    nm = _struct.unpack('>l', f0.read(1*4))[0]
+    xmax = _np.fromfile(f0, dtype='>f4', count=nm).astype(float)
+    ixdr = f0.tell()
+    if dfact == 6:
+        shape = (nm, nobs, lnum, ny, nx, dfact)
+    else:
+        shape = (nm, nobs, lnum, ny, nx)
+    f0.seek(ixdr + 4*int(_np.prod(shape)))
+    obslist = _np.fromfile(f0, dtype='>f4', count=2*nobs).astype(float)
+    lbdarr = _np.fromfile(f0, dtype='>f4', count=lnum+1).astype(float)
+    fend = f0.tell()
+    f0.seek(0, 2)
+    if fend == f0.tell():
+        if not quiet:
+            print('# XDR {} completely read!'.format(file))
+    else:
+        print('# Warning: XDR {} not completely read!'.format(file))
+        print('# length difference is {}'.format( (f0.tell()-fend)/4 ) )
+    f0.close()
+    data = MapData(file, ixdr, shape)
+    lbdc = (lbdarr[:-1]+lbdarr[1:])/2.
+    return data, obslist, lbdc, Ra, xmax
+
+
 def img2fits(img, lbd, xmax, dist, outname='model', rot=0., lum=0.,
     orient=0., coordsinf=None, deg=False, ulbd=''):
     """ Export an image (e.g., data[0,0,0,:,:]) to the fits format.
@@ -485,6 +603,12 @@ def fastnumvis(img, lbd, Bproj, PA, rad_per_pixel, PAdisk=90.):
 def fastnumvis3(img, lbd, Bprojs, PAs, rad_per_pixel, PAdisk=90.):
     """
     Call the routine fastnumvis for each of the 3 baselines available.
+
+    Note: the third baseline is built with (u, v) = B*(cos(PA), sin(PA)),
+    while `fastnumvis` uses B*(sin(PA), cos(PA)); its PA is thus the
+    mirror (about PA = 45 deg) of the closing baseline. `fastnumvis3arr`
+    uses the closing baseline -(u1+u2, v1+v2), and the two closure phases
+    differ in general.
     """
     u1 = Bprojs[0]*_np.cos(PAs[0]*_np.pi/180.)
     u2 = Bprojs[1]*_np.cos(PAs[1]*_np.pi/180.)
@@ -504,6 +628,337 @@ def fastnumvis3(img, lbd, Bprojs, PAs, rad_per_pixel, PAdisk=90.):
     return complexVis, VisAmp, VisPhase
 
 
+# Pixel coordinates of the last image geometry (see `_spacecoords1d`). A
+# single slot: the pixel scale changes in fitting loops (e.g., distance).
+_spacecoords = {}
+
+
+def _spacecoords1d(nx, ny, rad_per_pixel):
+    """ Separable version of `setspacecoords` (centered image): return the
+    x (nx) and y (ny) angular coordinates. Only the last image geometry is
+    kept in cache. """
+    key = (nx, ny, rad_per_pixel)
+    if key not in _spacecoords:
+        x = (_np.arange(0., nx)-(nx-1)/2.)*rad_per_pixel
+        y = (_np.arange(0., ny)-(ny-1)/2.)*rad_per_pixel
+        _spacecoords.clear()
+        _spacecoords[key] = (x, y)
+    return _spacecoords[key]
+
+
+def _uvdisk(u, v, lbd, PAdisk=90.):
+    """ Spatial frequencies (1/rad) of the (u, v) points in the image
+    orientation (see `fastnumvis`). """
+    dPA = (90.-PAdisk)*_np.pi/180.
+    uimg = (u*_np.cos(dPA) + v*_np.sin(dPA))/lbd
+    vimg = (v*_np.cos(dPA) - u*_np.sin(dPA))/lbd
+    return uimg, vimg
+
+
+def _lbdplanes(cube, lbd, lbdc=None):
+    """ Return the image cube as (nlbd, ny, nx) and the index of the
+    nearest wavelength plane of each `lbd` point. """
+    cube = _np.asarray(cube, dtype=float)
+    if cube.ndim == 2:
+        cube = cube[_np.newaxis]
+    if lbdc is None or len(cube) == 1:
+        if len(cube) > 1:
+            print('# ERROR: `lbdc` is needed to select the wavelength planes!')
+            raise ValueError('missing lbdc')
+        return cube, _np.zeros(_np.size(lbd), dtype=int)
+    lbdc = _np.asarray(lbdc, dtype=float)
+    ilbd = _np.abs(lbdc[:, _np.newaxis] - _np.ravel(lbd)[_np.newaxis, :]).\
+    argmin(axis=0)
+    return cube, ilbd
+
+
+def _dftplane(img, uimg, vimg, rad_per_pixel, chunk=2048):
+    """ Normalized visibilities of the image `img` at the spatial
+    frequencies (`uimg`, `vimg`), by separable matrix DFTs. """
+    ny, nx = img.shape
+    x, y = _spacecoords1d(nx, ny, rad_per_pixel)
+    img = _np.where(img > 0, img, 0.)
+    complexVis = _np.zeros(len(uimg), dtype=complex)
+    for i in range(0, len(uimg), chunk):
+        Ex = _np.exp(-2j*_np.pi*_np.outer(uimg[i:i+chunk], x))
+        Ey = _np.exp(-2j*_np.pi*_np.outer(vimg[i:i+chunk], y))
+        complexVis[i:i+chunk] = _np.sum(Ey.T*_np.dot(img, Ex.T), axis=0)
+    return complexVis/_np.sum(img)
+
+
+def fastnumvisarr(cube, lbd, u, v, rad_per_pixel, lbdc=None, PAdisk=90.,
+    chunk=2048):
+    """
+    Array version of `fastnumvis`: visibilities of all the (u, v, lbd)
+    points at once.
+
+    The image of each point is the plane of `cube` (nlbd, ny, nx) with the
+    nearest central wavelength `lbdc` (same units of `lbd`). `u` and `v` are
+    the baseline coordinates (East and North; same units of `lbd`), i.e.,
+    `u = Bproj*sin(PA)` and `v = Bproj*cos(PA)`.
+
+    The Fourier transform is computed as separable matrix DFTs (i.e.,
+    `Ey.img.Ex`), in chunks of `chunk` points. The pixel coordinates of the
+    last image geometry are cached.
+
+    OUTPUT: complexVis, VisAmp, VisPhase (arrays with the shape of `u`).
+    """
+    shape = _np.shape(u)
+    u, v, lbd = [_np.ravel(a).astype(float) for a in
+    _np.broadcast_arrays(u, v, lbd)]
+    cube, ilbd = _lbdplanes(cube, lbd, lbdc)
+    uimg, vimg = _uvdisk(u, v, lbd, PAdisk=PAdisk)
+    complexVis = _np.zeros(len(u), dtype=complex)
+    for k in _np.unique(ilbd):
+        idx = _np.where(ilbd == k)[0]
+        complexVis[idx] = _dftplane(cube[k], uimg[idx], vimg[idx],
+        rad_per_pixel, chunk=chunk)
+    complexVis = complexVis.reshape(shape)
+    VisAmp = _np.abs(complexVis)
+    VisPhase = _np.arctan2(complexVis.imag, complexVis.real)*_np.double(180./_np.pi)
+    return complexVis, VisAmp, VisPhase
+
+
+def fastnumvis3arr(cube, lbd, u1, v1, u2, v2, rad_per_pixel, lbdc=None,
+    PAdisk=90., chunk=2048):
+    """
+    Array version of `fastnumvis3`: bispectrum of all the triangles
+    (u1, v1), (u2, v2), -(u1+u2, v1+v2) at once (OIFITS convention). See
+    `fastnumvisarr`.
+
+    Unlike `fastnumvis3`, the (u, v) are East and North (`u = Bproj*sin(PA)`,
+    `v = Bproj*cos(PA)`) for the three baselines, so the third one is the
+    true closing baseline. `fastnumvis3` builds it with sin and cos swapped
+    (i.e., mirrored about PA = 45 deg): the results agree only for
+    triangles symmetric about that axis.
+
+    OUTPUT: complexVis, VisAmp, VisPhase (arrays with the shape of `u1`).
+    """
+    u1, v1, u2, v2, lbd = _np.broadcast_arrays(u1, v1, u2, v2, lbd)
+    cV = fastnumvisarr(cube, _np.array([lbd, lbd, lbd]), _np.array([u1, u2,
+    u1+u2]), _np.array([v1, v2, v1+v2]), rad_per_pixel, lbdc=lbdc,
+    PAdisk=PAdisk, chunk=chunk)[0]
+    complexVis = cV[0]*cV[1]*cV[2].conjugate()
+
+    VisAmp = _np.abs(complexVis)
+    VisPhase = _np.arctan2(complexVis.imag, complexVis.real)*_np.double(180./_np.pi)
+    return complexVis, VisAmp, VisPhase
+
+
+def _fftplane(img, pad):
+    """ Normalized FFT of the image `img` zero-padded by the factor `pad`. """
+    ny, nx = img.shape
+    img = _np.where(img > 0, img, 0.)
+    return _np.fft.fft2(img, s=(int(pad*ny), int(pad*nx)))/_np.sum(img)
+
+
+def _lagweights(d):
+    """ Lagrange interpolation weights, where `d` (npts, nnodes) is the
+    distance between the interpolation point and each node. """
+    w = _np.ones(d.shape)
+    for j in range(d.shape[1]):
+        for m in range(d.shape[1]):
+            if m != j:
+                w[:, j] *= d[:, m]/(d[:, m]-d[:, j])
+    return w
+
+
+def _uvinterp(F, nx, ny, rad_per_pixel, uimg, vimg, interp='lagrange'):
+    """ Interpolate the FFT `F` (see `_fftplane`) of an image of (nx, ny)
+    pixels at the spatial frequencies (`uimg`, `vimg`).
+
+    The phase of the image center is restored in the grid points before
+    the interpolation. `interp` = 'linear' (bilinear) or 'lagrange'
+    (separable 6x6 points Lagrange polynomials).
+    """
+    Ny, Nx = F.shape
+    a = 1 if interp == 'linear' else 3
+    fu = uimg*Nx*rad_per_pixel
+    fv = vimg*Ny*rad_per_pixel
+    ku = _np.floor(fu)[:, _np.newaxis] + _np.arange(-a+1, a+1)
+    kv = _np.floor(fv)[:, _np.newaxis] + _np.arange(-a+1, a+1)
+    wu = _lagweights(fu[:, _np.newaxis]-ku)*_np.exp(1j*_np.pi*(nx-1)*ku/Nx)
+    wv = _lagweights(fv[:, _np.newaxis]-kv)*_np.exp(1j*_np.pi*(ny-1)*kv/Ny)
+    Fk = F[(kv % Ny).astype(int)[:, :, _np.newaxis],
+    (ku % Nx).astype(int)[:, _np.newaxis, :]]
+    return _np.sum(_np.sum(Fk*wu[:, _np.newaxis, :], axis=2)*wv, axis=1)
+
+
+def fftnumvisarr(cube, lbd, u, v, rad_per_pixel, lbdc=None, PAdisk=90.,
+    tol=1e-3, interp='lagrange', pad=2, maxpad=16, nchk=32):
+    """
+    FFT version of `fastnumvisarr`, for dense uv coverages.
+
+    Each (used) plane of `cube` is zero-padded by the factor `pad` and
+    Fourier transformed once; the visibilities are interpolated in the uv
+    plane (`interp` = 'linear' or 'lagrange'; see `_uvinterp`).
+
+    The accuracy is checked against the DFT on `nchk` points of each plane:
+    if the maximum complex difference is larger than `tol`/2 (i.e., a safety
+    margin for the non-checked points), the padding is doubled (up to
+    `maxpad`; beyond it, the DFT is used for the plane). ValueError is raised
+    if `pad` > `maxpad`.
+
+    OUTPUT: complexVis, VisAmp, VisPhase (arrays with the shape of `u`).
+    """
+    if pad > maxpad:
+        raise ValueError('`pad` ({0}) must not be larger than `maxpad` ({1})!'.
+        format(pad, maxpad))
+    shape = _np.shape(u)
+    u, v, lbd = [_np.ravel(a).astype(float) for a in
+    _np.broadcast_arrays(u, v, lbd)]
+    cube, ilbd = _lbdplanes(cube, lbd, lbdc)
+    uimg, vimg = _uvdisk(u, v, lbd, PAdisk=PAdisk)
+    nlbd, ny, nx = cube.shape
+    complexVis = _np.zeros(len(u), dtype=complex)
+    for k in _np.unique(ilbd):
+        idx = _np.where(ilbd == k)[0]
+        ichk = idx[_np.unique(_np.linspace(0, len(idx)-1, nchk).astype(int))]
+        chk = _dftplane(cube[k], uimg[ichk], vimg[ichk], rad_per_pixel)
+        kpad = pad
+        while kpad <= maxpad:
+            F = _fftplane(cube[k], kpad)
+            err = _np.max(_np.abs(_uvinterp(F, nx, ny, rad_per_pixel,
+            uimg[ichk], vimg[ichk], interp=interp) - chk))
+            if err <= tol/2.:
+                complexVis[idx] = _uvinterp(F, nx, ny, rad_per_pixel,
+                uimg[idx], vimg[idx], interp=interp)
+                break
+            kpad *= 2
+        else:
+            print('# Warning! FFT tolerance not reached (error = {0:.1e}); '
+            'using DFT for plane {1}.'.format(err, k))
+            complexVis[idx] = _dftplane(cube[k], uimg[idx], vimg[idx],
+            rad_per_pixel)
+    complexVis = complexVis.reshape(shape)
+    VisAmp = _np.abs(complexVis)
+    VisPhase = _np.arctan2(complexVis.imag, complexVis.real)*_np.double(180./_np.pi)
+    return complexVis, VisAmp, VisPhase
+
+
+def numvisarr(cube, lbd, u, v, rad_per_pixel, lbdc=None, PAdisk=90.,
+    method='auto', tol=1e-3, interp='lagrange'):
+    """
+    Visibilities of the (u, v, lbd) points of the image `cube`, by matrix
+    DFT (`fastnumvisarr`) or FFT and uv interpolation (`fftnumvisarr`).
+
+    `method` = 'dft', 'fft' or 'auto'. With 'auto', the FFT is used when its
+    estimated cost (padded FFT of the used planes plus interpolation) is
+    smaller than the one of the DFT (number of points x number of pixels).
+
+    OUTPUT: complexVis, VisAmp, VisPhase (arrays with the shape of `u`).
+    """
+    if method == 'auto':
+        ny, nx = _np.shape(cube)[-2:]
+        lbdarr = _np.ravel(_np.broadcast_arrays(u, lbd)[1])
+        nplanes = len(_np.unique(_lbdplanes(_np.zeros((1, 1, 1)) if lbdc is None
+        else _np.zeros((len(lbdc), 1, 1)), lbdarr, lbdc)[1]))
+        npix = 4*nx*ny
+        costfft = nplanes*(5*npix*_np.log2(npix) + 16*npix) + 36*len(lbdarr)
+        costdft = len(lbdarr)*(nx*ny + 2*(nx+ny))
+        method = 'fft' if costfft < costdft else 'dft'
+    if method == 'fft':
+        return fftnumvisarr(cube, lbd, u, v, rad_per_pixel, lbdc=lbdc,
+        PAdisk=PAdisk, tol=tol, interp=interp)
+    return fastnumvisarr(cube, lbd, u, v, rad_per_pixel, lbdc=lbdc,
+    PAdisk=PAdisk)
+
+
+def oifitsflat(oidata):
+    """
+    Gather the V2, visibility phase and closure phase points of an `oifits`
+    object into flat arrays (flagged points and points with non-positive
+    errors are removed). The row objects of columnar `oifits` objects (see
+    `oifits.open`) are not built.
+
+    OUTPUT: dict with keys 'vis2' (u, v, lbd, data, err), 'visphi' (u, v,
+    lbd, data, err) and 't3phi' (u1, v1, u2, v2, lbd, data, err). Phases in
+    degrees; (u, v) and lbd in meters.
+    """
+    def tables(key):
+        """ Columns of the tables (columnar `oifits`) or of each row. """
+        if key not in oidata.__dict__ and 'columns' in oidata.__dict__:
+            return oidata.columns[key]
+        return [dict([(k[1:] if k[0] == '_' else k, _np.atleast_1d(v)[
+        _np.newaxis]) for k, v in row.__dict__.items()] + [('wavelength',
+        row.wavelength)]) for row in getattr(oidata, key)]
+
+    def flat(key, coords, data, err):
+        cols = dict([(k, []) for k in coords + ['lbd', 'data', 'err']])
+        for tab in tables(key):
+            lbd = tab['wavelength'].eff_wave
+            good = ~tab['flag'] & (tab[err] > 0)
+            for k in coords:
+                cols[k] += [_np.repeat(_np.reshape(tab[k], (-1, 1)),
+                len(lbd), axis=1)[good]]
+            cols['lbd'] += [(lbd*_np.ones(good.shape))[good]]
+            cols['data'] += [tab[data][good]]
+            cols['err'] += [tab[err][good]]
+        return dict([(k, _np.concatenate(cols[k]) if len(cols[k]) > 0 else
+        _np.empty(0)) for k in cols])
+
+    obs = {}
+    obs['vis2'] = flat('vis2', ['ucoord', 'vcoord'], 'vis2data', 'vis2err')
+    obs['visphi'] = flat('vis', ['ucoord', 'vcoord'], 'visphi', 'visphierr')
+    obs['t3phi'] = flat('t3', ['u1coord', 'v1coord', 'u2coord', 'v2coord'],
+    't3phi', 't3phierr')
+    for k in ('vis2', 'visphi'):
+        obs[k]['u'] = obs[k].pop('ucoord')
+        obs[k]['v'] = obs[k].pop('vcoord')
+    for k in ('u1', 'v1', 'u2', 'v2'):
+        obs['t3phi'][k] = obs['t3phi'].pop(k+'coord')
+    return obs
+
+
+def oifitschi2(cube, rad_per_pixel, oidata, lbdc=None, PAdisk=90.,
+    method='auto', tol=1e-3):
+    """
+    Compare an image `cube` (nlbd, ny, nx) with the V2, visibility phase
+    and closure phase of an `oifits` object.
+
+    All the model observables are computed in a single `numvisarr` call
+    (`method`, `tol`). `lbdc` are the central wavelengths of the cube
+    planes, in meters. To be used inside fitting loops, `oidata` can also
+    be the output of `oifitsflat(oidata)` (computed only once).
+
+    The phase residuals are wrapped to [-180, 180] degrees.
+
+    OUTPUT: chi2, res
+
+        - chi2 = dict of the chi2 of 'vis2', 'visphi' and 't3phi'
+        - res = dict of the (data-model)/err arrays (see `oifitsflat`)
+    """
+    obs = oidata if isinstance(oidata, dict) else oifitsflat(oidata)
+    vis2, visphi, t3phi = obs['vis2'], obs['visphi'], obs['t3phi']
+    u = _np.concatenate([vis2['u'], visphi['u'], t3phi['u1'], t3phi['u2'],
+    t3phi['u1']+t3phi['u2']])
+    v = _np.concatenate([vis2['v'], visphi['v'], t3phi['v1'], t3phi['v2'],
+    t3phi['v1']+t3phi['v2']])
+    lbd = _np.concatenate([vis2['lbd'], visphi['lbd'], t3phi['lbd'],
+    t3phi['lbd'], t3phi['lbd']])
+    if len(u) > 0:
+        cV = numvisarr(cube, lbd, u, v, rad_per_pixel, lbdc=lbdc,
+        PAdisk=PAdisk, method=method, tol=tol)[0]
+    else:
+        cV = _np.empty(0, dtype=complex)
+    n0, n1, n3 = len(vis2['u']), len(visphi['u']), len(t3phi['u1'])
+    mod = {}
+    mod['vis2'] = _np.abs(cV[:n0])**2
+    mod['visphi'] = _np.angle(cV[n0:n0+n1], deg=True)
+    cV = cV[n0+n1:]
+    mod['t3phi'] = _np.angle(cV[:n3]*cV[n3:2*n3]*cV[2*n3:].conjugate(),
+    deg=True)
+    chi2 = {}
+    res = {}
+    for k in ('vis2', 'visphi', 't3phi'):
+        dif = obs[k]['data']-mod[k]
+        if k != 'vis2':
+            dif = (dif+180.) % 360. - 180.
+        res[k] = dif/obs[k]['err']
+        chi2[k] = _np.sum(res[k]**2)
+    return chi2, res
+
+
 def plot_pionier(oidata, ffile='last_run', fmt=['png'], legend=True, model=None,
     obs=None, dist=None):
     """  Standard observational log for PIONIER
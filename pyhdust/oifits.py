@@ -68,6 +68,7 @@ import pyfits as _pyfits
 import datetime as _datetime
 import copy as _copy
 import numpy as _np
+import pyhdust.phc as _phc
 
 __author__ = "Daniel Moser; Paul Boley"
 __email__ = "dmfaes@gmail.com; boley@mpia-hd.mpg.de"
@@ -629,12 +630,29 @@ class oifits:
         self.t3 = _np.empty(0)
         self.hdrinfo = {}
 
+    def __getattr__(self, attrname):
+        # Columnar objects (see `open`): the rows are built on demand
+        if attrname in ('vis', 'vis2', 't3') and 'columns' in self.__dict__:
+            rows = _oirows(attrname, self.__dict__['columns'][attrname])
+            self.__dict__[attrname] = rows
+            return rows
+        else:
+            raise AttributeError, attrname
+
+    def nrows(self, attrname):
+        """Number of rows (measurements) of 'vis', 'vis2' or 't3',
+        without building the row objects of columnar objects."""
+        if attrname not in self.__dict__ and 'columns' in self.__dict__:
+            return sum([len(cols['time']) for cols in self.columns[attrname]])
+        return len(getattr(self, attrname))
+
     def __add__(self, other):
         """Consistently combine two separate oifits objects.  Note
         that targets can be matched by name only (e.g. if coordinates
         differ) by setting oifits.matchtargetbyname to True.  The same
         goes for stations of the array (controlled by
-        oifits.matchstationbyname)"""
+        oifits.matchstationbyname).  To combine many objects at once,
+        see merge()."""
         # Don't do anything if the two oifits objects are not CONSISTENT!
         if not self.isconsistent() or not other.isconsistent():
             print 'oifits objects are not consistent, bailing.'
@@ -905,30 +923,30 @@ class oifits:
                     self.array[key].info(verbose=verbose)
                 stations += len(self.array[key].station)
             print "%d array%s with %d station%s"%(len(self.array), _plurals(len(self.array)), stations, _plurals(stations))
-        if self.vis.size:
+        if self.nrows('vis'):
             if recursive:
                 print "===================================================================="
                 print "SUMMARY OF VISIBILITY MEASUREMENTS"
                 print "===================================================================="
                 for vis in self.vis:
                     vis.info()
-            print "%d visibility measurement%s"%(len(self.vis), _plurals(len(self.vis)))
-        if self.vis2.size:
+            print "%d visibility measurement%s"%(self.nrows('vis'), _plurals(self.nrows('vis')))
+        if self.nrows('vis2'):
             if recursive:
                 print "===================================================================="
                 print "SUMMARY OF VISIBILITY^2 MEASUREMENTS"
                 print "===================================================================="
                 for vis2 in self.vis2:
                     vis2.info()
-            print "%d visibility^2 measurement%s"%(len(self.vis2), _plurals(len(self.vis2)))
-        if self.t3.size:
+            print "%d visibility^2 measurement%s"%(self.nrows('vis2'), _plurals(self.nrows('vis2')))
+        if self.nrows('t3'):
             if recursive:
                 print "===================================================================="
                 print "SUMMARY OF T3 MEASUREMENTS"
                 print "===================================================================="
                 for t3 in self.t3:
                     t3.info()
-            print "%d closure phase measurement%s"%(len(self.t3), _plurals(len(self.t3)))
+            print "%d closure phase measurement%s"%(self.nrows('t3'), _plurals(self.nrows('t3')))
 
     def save(self, filename):
         """Write the contents of the oifits object to a file in OIFITS
@@ -1299,8 +1317,87 @@ class oifits:
 
 
 
-def open(filename, quiet=False):
-    """Open an OIFITS file."""
+# Columns of the OI_VIS, OI_VIS2 and OI_T3 tables: coordinates and data
+_oicols = {
+    'vis': (['ucoord', 'vcoord'], ['visamp', 'visamperr', 'visphi',
+        'visphierr', 'cflux', 'cfluxerr'], 2, OI_VIS),
+    'vis2': (['ucoord', 'vcoord'], ['vis2data', 'vis2err'], 2, OI_VIS2),
+    't3': (['u1coord', 'v1coord', 'u2coord', 'v2coord'], ['t3amp',
+        't3amperr', 't3phi', 't3phierr'], 3, OI_T3)}
+
+
+def _oicolumns(key, hdu, hdulist, wavelength, array, stations, targetmap):
+    """Read an OI_VIS, OI_VIS2 or OI_T3 table as contiguous arrays.
+
+    The observation times are converted at once ('timeobs' as
+    datetime64[us] and 'mjd')."""
+    coords, fields, nsta, rowclass = _oicols[key]
+    data = hdu.data
+    n = len(data)
+    cols = {'wavelength': wavelength, 'array': array, 'stations': stations,
+        'targetmap': targetmap}
+    date = getDate(hdu, hdulist)
+    date0 = _np.datetime64('{0:04d}-{1:02d}-{2:02d}'.format(int(date[0]),
+        int(date[1]), int(date[2])), 'us')
+    cols['time'] = _np.array(data.field('TIME'), dtype=_np.double)
+    cols['timeobs'] = date0 + _np.around(_np.around(cols['time'], 2)*1e6).\
+        astype('timedelta64[us]')
+    cols['mjd'] = (cols['timeobs'] - _np.datetime64(_mjdzero, 'us')) / \
+        _np.timedelta64(86400000000, 'us')
+    cols['int_time'] = _np.array(data.field('INT_TIME'))
+    cols['target_id'] = _np.array(data.field('TARGET_ID'))
+    for name in coords:
+        cols[name] = _np.array(data.field(name.upper()), dtype=_np.double)
+    for name in fields:
+        if name.upper() in data.names:
+            cols[name] = _np.array(data.field(name.upper()),
+                dtype=_np.double).reshape(n, -1)
+        else:
+            cols[name] = None
+    cols['flag'] = _np.array(data.field('FLAG'), dtype=bool).reshape(n, -1)
+    if array:
+        cols['sta_index'] = _np.array(data.field('STA_INDEX')).reshape(n,
+            nsta)
+    else:
+        cols['sta_index'] = None
+    return cols
+
+
+def _oirows(key, columns):
+    """Build the OI_VIS, OI_VIS2 or OI_T3 row objects of columnar tables
+    (see `_oicolumns`)."""
+    coords, fields, nsta, rowclass = _oicols[key]
+    rows = []
+    for cols in columns:
+        timeobs = cols['timeobs'].tolist()
+        for i in range(len(timeobs)):
+            kw = {}
+            for name in coords + ['int_time', 'flag']:
+                kw[name] = cols[name][i]
+            for name in fields:
+                if cols[name] is not None:
+                    kw[name] = cols[name][i]
+            if cols['array']:
+                kw['station'] = [cols['stations'][sta] for sta in
+                    cols['sta_index'][i]]
+            else:
+                kw['station'] = [None]*nsta
+            rows += [rowclass(timeobs=timeobs[i], wavelength=cols['wavelength'],
+                target=cols['targetmap'][cols['target_id'][i]],
+                array=cols['array'], **kw)]
+    objrows = _np.empty(len(rows), dtype=object)
+    objrows[:] = rows
+    return objrows
+
+
+@_phc.filecache
+def open(filename, quiet=False, columnar=False):
+    """Open an OIFITS file.
+
+    If `columnar`, the OI_VIS, OI_VIS2 and OI_T3 tables are kept as
+    contiguous arrays (`oifits.columns`, one dict of arrays per table,
+    with the times converted at once). The row objects (`oifits.vis`,
+    `.vis2` and `.t3`) are built only when accessed."""
     
     newobj = oifits()
     targetmap = {}
@@ -1352,6 +1449,9 @@ def open(filename, quiet=False):
             # later to match measurements to stations
             sta_indices[arrname] = data.field('sta_index')
             
+    if columnar:
+        newobj.columns = {'vis': [], 'vis2': [], 't3': []}
+        del newobj.vis, newobj.vis2, newobj.t3
     # Then get any science measurements
     for hdu in hdulist:
         header = hdu.header
@@ -1366,7 +1466,15 @@ def open(filename, quiet=False):
             else:
                 array = None
             wavelength = newobj.wavelength[header['INSNAME']]
-        if hdu.name == 'OI_VIS':
+        if columnar and hdu.name in ('OI_VIS', 'OI_VIS2', 'OI_T3'):
+            if array:
+                stations = dict(zip(sta_indices[arrname], array.station))
+            else:
+                stations = None
+            key = hdu.name[3:].lower()
+            newobj.columns[key] += [_oicolumns(key, hdu, hdulist, wavelength,
+                array, stations, targetmap)]
+        elif hdu.name == 'OI_VIS':
             for row in data:
                 date = getDate(hdu, hdulist)
                 timeobs = _datetime.datetime(int(date[0]), int(date[1]), int(date[2])) + _datetime.timedelta(seconds=_np.around(row.field('TIME'), 2))
@@ -1477,6 +1585,125 @@ def open(filename, quiet=False):
 
     return newobj
 
+
+def merge(oilist, quiet=False):
+    """Consistently combine many oifits objects at once.
+
+    The wavelength tables, targets, arrays and stations are matched as in
+    oifits.__add__ (see oifits.matchtargetbyname and
+    oifits.matchstationbyname).  The measurements are deduplicated by
+    their (target name, observation time, station names, insname) key;
+    the first occurrence is kept.  Each table (vis, vis2 and t3) is
+    concatenated only once.
+
+    No deep copies are done: the objects of the input oifits are reused
+    when unchanged, and are shallow-copied only when their references
+    (or the stations of an array) have to change."""
+    new = oifits()
+    wavelengthmap = {}
+    targetmap = {}
+    arraymap = {}
+    stationmap = {}
+    targetsbyname = {}
+    ownarrays = set()
+    for obj in oilist:
+        if not obj.isconsistent():
+            print 'oifits objects are not consistent, bailing.'
+            return
+        for key, wavelength in obj.wavelength.iteritems():
+            if key not in new.wavelength:
+                new.wavelength[key] = wavelength
+            elif new.wavelength[key] is not wavelength and \
+                new.wavelength[key] != wavelength:
+                raise ValueError('Wavelength tables have the same key but differing contents.')
+            wavelengthmap[id(wavelength)] = new.wavelength[key]
+
+        for otarget in obj.target:
+            for ntarget in targetsbyname.get(otarget.target, []):
+                if matchtargetbyname or ntarget is otarget or \
+                    ntarget == otarget:
+                    targetmap[id(otarget)] = ntarget
+                    break
+            else:
+                if otarget.target in targetsbyname and not quiet:
+                    print 'Found a target with a matching name, but some differences in the target specification.  Creating a new target.  Set oifits.matchtargetbyname to True to override this behavior.'
+                targetsbyname.setdefault(otarget.target, []).append(otarget)
+                new.target = _np.append(new.target, otarget)
+                targetmap[id(otarget)] = otarget
+
+        for key, otharray in obj.array.iteritems():
+            if key not in new.array:
+                new.array[key] = otharray
+            newarray = new.array[key]
+            arraymap[id(otharray)] = key
+            stations = dict([(sta.sta_name, sta) for sta in newarray.station])
+            addsta = []
+            for othsta in otharray.station:
+                newsta = stations.get(othsta.sta_name)
+                if newsta is None:
+                    if newarray is not otharray and \
+                        not _array_eq(otharray.arrxyz, newarray.arrxyz):
+                        newsta = _copy.copy(othsta)
+                        # Make sure that staxyz of the new station is
+                        # relative to the new array center
+                        newsta.staxyz = othsta.staxyz - otharray.arrxyz + \
+                            newarray.arrxyz
+                    else:
+                        newsta = othsta
+                    addsta += [newsta]
+                    stations[othsta.sta_name] = newsta
+                elif newsta is not othsta and newsta != othsta and \
+                    not matchstationbyname:
+                    raise ValueError('Stations have matching names but conflicting data.')
+                stationmap[id(othsta)] = newsta
+            if len(addsta) > 0:
+                # The array of an input object is not modified in place
+                if id(newarray) not in ownarrays:
+                    newarray = _copy.copy(newarray)
+                    new.array[key] = newarray
+                    ownarrays.add(id(newarray))
+                newarray.station = _np.concatenate((newarray.station,
+                    _np.array(addsta, dtype=object)))
+
+    for attrname in ('vis', 'vis2', 't3'):
+        keys = set()
+        rows = []
+        for obj in oilist:
+            insnames = dict([(id(wavelength), key) for key, wavelength in
+                obj.wavelength.iteritems()])
+            for row in getattr(obj, attrname):
+                rowkey = (row.target.target, row.timeobs, tuple([sta and
+                    sta.sta_name for sta in row.station]),
+                    insnames[id(row.wavelength)])
+                if rowkey in keys:
+                    continue
+                keys.add(rowkey)
+                # The wavelength, target, array and station objects
+                # should point to the appropriate objects inside the
+                # 'new' structure
+                refs = {'wavelength': wavelengthmap[id(row.wavelength)],
+                    'target': targetmap[id(row.target)]}
+                if row.array:
+                    refs['array'] = new.array[arraymap[id(row.array)]]
+                    refs['station'] = [stationmap[id(sta)] for sta in
+                        row.station]
+                if any([refs[k] is not getattr(row, k) for k in refs
+                    if k != 'station']) or ('station' in refs and
+                    any([a is not b for a, b in zip(refs['station'],
+                    row.station)])):
+                    row = _copy.copy(row)
+                    for k in refs:
+                        setattr(row, k, refs[k])
+                rows += [row]
+        objrows = _np.empty(len(rows), dtype=object)
+        objrows[:] = rows
+        setattr(new, attrname, objrows)
+
+    if not quiet:
+        new.info(recursive=False)
+    return new
+
+
 ### MAIN ###
 if __name__ == "__main__":
     pass
@@ -13,6 +13,10 @@ import os as _os
 import re as _re
 import numpy as _np
 import datetime as _dt
+import sys as _sys
+import functools as _functools
+import inspect as _inspect
+from collections import OrderedDict as _OrderedDict
 from glob import glob as _glob
 from itertools import product as _product
 import pyhdust.jdcal as _jdcal
@@ -702,6 +706,147 @@ def fit_linear(x, y, sx, sy, param0=None, clip=True, sclip=4, nmax=5):
 
 
 
+# File readers cache
+_fcache = _OrderedDict()
+_fcachestat = {'maxbytes': 0, 'maxentries': 128, 'nbytes': 0, 'hits': 0,
+    'misses': 0}
+
+
+def _fcacheevict():
+    """ Evict the least recently used results beyond the cache limits. """
+    while _fcache and (_fcachestat['nbytes'] > _fcachestat['maxbytes'] or
+        len(_fcache) > _fcachestat['maxentries']):
+        oldkey, oldentry = _fcache.popitem(last=False)
+        _fcachestat['nbytes'] -= oldentry[1]
+    return
+
+
+def _ismmap(arr):
+    """ Check if a numpy array is (a view of) a memory-mapped file. """
+    while isinstance(arr, _np.ndarray):
+        if isinstance(arr, _np.memmap):
+            return True
+        arr = arr.base
+    return False
+
+
+def _objnbytes(obj, seen=None):
+    """ Estimate the memory size (in bytes) of an object.
+
+    Numpy arrays count their data (zero if memory-mapped; these results are
+    limited by the number of entries of the cache); containers and class
+    instances are evaluated recursively. """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, _np.ndarray):
+        if _ismmap(obj):
+            return 0
+        if obj.dtype == object:
+            return obj.nbytes + sum([_objnbytes(o, seen) for o in obj.flat])
+        return obj.nbytes
+    size = _sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum([_objnbytes(k, seen) + _objnbytes(v, seen) for k, v in
+        obj.items()])
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum([_objnbytes(o, seen) for o in obj])
+    elif hasattr(obj, '__dict__'):
+        size += _objnbytes(obj.__dict__, seen)
+    return size
+
+
+def filecache(reader):
+    """ Decorator that makes a file reader use the files cache.
+
+    The results are kept in memory keyed by (reader, absolute path,
+    modification time, size, reader arguments), i.e., they are automatically
+    invalidated when the file changes. The arguments are normalized with
+    their names and default values (e.g., `readmap(f)` and `readmap(file=f)`
+    share the entry). The least recently used results are evicted to keep
+    the cache inside its byte budget and number of entries (see
+    `setFileCache`).
+
+    The cached results are shared between calls: copy them before any
+    in-place modification.
+
+    The first argument of `reader` must be the file path.
+    """
+    @_functools.wraps(reader)
+    def cachedreader(*args, **kwargs):
+        if _fcachestat['maxbytes'] <= 0:
+            return reader(*args, **kwargs)
+        try:
+            callargs = _inspect.getcallargs(reader, *args, **kwargs)
+            fname = reader.__code__.co_varnames[0]
+            fpath = _os.path.abspath(callargs.pop(fname))
+            st = _os.stat(fpath)
+            key = (reader.__module__, reader.__name__, fpath, st.st_mtime,
+            st.st_size, tuple(sorted(callargs.items())))
+            hash(key)
+        except (TypeError, AttributeError, OSError):
+            return reader(*args, **kwargs)
+        if key in _fcache:
+            _fcachestat['hits'] += 1
+            entry = _fcache.pop(key)
+            _fcache[key] = entry
+            return entry[0]
+        _fcachestat['misses'] += 1
+        result = reader(*args, **kwargs)
+        nbytes = _objnbytes(result)
+        if nbytes <= _fcachestat['maxbytes']:
+            _fcache[key] = (result, nbytes)
+            _fcachestat['nbytes'] += nbytes
+            _fcacheevict()
+        return result
+    return cachedreader
+
+
+def setFileCache(maxbytes=256*1024**2, maxentries=128):
+    """ Set the byte budget and the maximum number of entries of the file
+    readers cache (`filecache`).
+
+    `maxbytes` = 0 disables the cache (default state). Reducing the limits
+    evicts the least recently used results. `maxentries` also bounds the
+    memory-mapped results, which do not count in the byte budget.
+
+    The readers using the cache are: `pyhdust.readfullsed2`,
+    `pyhdust.readsed2`, `pyhdust.readtemp`, `interftools.readmap`,
+    `spectools.loadfits` and `oifits.open`.
+    """
+    _fcachestat['maxbytes'] = int(maxbytes)
+    _fcachestat['maxentries'] = int(maxentries)
+    _fcacheevict()
+    return
+
+
+def fileCacheInfo():
+    """ Return the file readers cache state.
+
+    OUTPUT: dict with 'maxbytes', 'maxentries', 'nbytes', 'hits', 'misses'
+    and 'entries' (list of (reader, path, nbytes), from the least to the most
+    recently used).
+    """
+    info = dict(_fcachestat)
+    info['entries'] = [('{0}.{1}'.format(k[0], k[1]), k[2], v[1]) for k, v
+    in _fcache.items()]
+    return info
+
+
+def clearFileCache(stats=True):
+    """ Remove all the results from the file readers cache.
+
+    If `stats`, the hits/misses statistics are also reset. """
+    _fcache.clear()
+    _fcachestat['nbytes'] = 0
+    if stats:
+        _fcachestat['hits'] = 0
+        _fcachestat['misses'] = 0
+    return
+
+
 #Constants
 c = Constant(2.99792458e10, 299792458., 'cm s-1', 'speed of light in vacuum')
 h = Constant(6.6260755e-27, 6.62606957e-34, 'erg s-1', 'Planck constant')
@@ -310,6 +310,7 @@ def shiftfits(fitsfile, newsh=None):
     return
 
 
+@_phc.filecache
 def loadfits(fitsfile):
     """load FITS spec
 